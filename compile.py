@@ -1,18 +1,55 @@
 #!/usr/bin/env python
 
+import argparse
 import sys
 import compiler
 
-with open(sys.argv[1], 'r') as f:
+argparser = argparse.ArgumentParser(description="Compile a COOL program to MIPS assembly")
+argparser.add_argument("source", help="COOL source file")
+argparser.add_argument("-o", "--output", help="write the assembly to this file instead of stdout")
+argparser.add_argument("--dump-ir", action="store_true", help="print the intermediate representation after every pass on stderr")
+argparser.add_argument("--time-passes", action="store_true", help="print the time spent in every pass on stderr")
+argparser.add_argument("--stats", action="store_true", help="print the counters reported by the passes on stderr")
+argparser.add_argument("--unboxed-attributes", action="store_true",
+                       help="store Int and Bool attributes as words in the objects")
+argparser.add_argument("--gc", choices=sorted(compiler.gc_functions), default="NO_GC",
+                       help="garbage collector of the runtime, NO_GC by default")
+argparser.add_argument("--gc-test", action="store_true", help="collect garbage at every allocation")
+args = argparser.parse_args()
+if args.unboxed_attributes and args.gc != "NO_GC":
+    argparser.error("--unboxed-attributes cannot be used with --gc %s" % args.gc)
+
+pass_timings = {} if args.time_passes else None
+statistics = {} if args.stats else None
+options = {
+    "ir_dump": sys.stderr if args.dump_ir else None,
+    "pass_timings": pass_timings,
+    "statistics": statistics,
+    "unboxed_attributes": args.unboxed_attributes,
+    "gc": args.gc,
+    "gc_test": args.gc_test,
+}
+
+with open(args.source, 'r') as f:
     ast = compiler.run_parse(f.read())
     if ast is None:
         print("Cannot parse!")
     else:
         try:
-            classes_dict = compiler.run_semant(ast)
-        except compiler.SemantError as e:
-            print("Semantic Analyzer failure: %s" % str(e))
+            class_table = compiler.run_semant(ast, all_errors=True)
+        except compiler.SemantErrors as e:
+            for error in e.errors:
+                print("Semantic Analyzer failure: %s" % error)
         else:
-            code = compiler.run_codegen(ast, classes_dict)
-            print("Generated MIPS code:")
-            print(code.getvalue())
+            if args.output:
+                with open(args.output, 'w') as out:
+                    compiler.run_codegen(ast, class_table, out, **options)
+            else:
+                print("Generated MIPS code:")
+                compiler.run_codegen(ast, class_table, sys.stdout, **options)
+            if pass_timings is not None:
+                for name, seconds in pass_timings.items():
+                    sys.stderr.write("%-30s %8.4fs\n" % (name, seconds))
+            if statistics is not None:
+                for name, value in statistics.items():
+                    sys.stderr.write("%-30s %8d\n" % (name, value))
@@ -1,9 +1,10 @@
 from .parser import parser
 from . import semant
-from .codegen import cgen
+from .codegen import cgen, gc_functions
 
 run_parse = parser.parse
 run_semant = semant.semant
 run_codegen = cgen
 
 SemantError = semant.SemantError
+SemantErrors = semant.SemantErrors
@@ -0,0 +1,94 @@
+from .parser import Attr, Method
+
+
+class ClassTable:
+    """the checked class hierarchy, with classes identified by dense ids
+
+    ids are assigned in depth-first pre-order starting from Object, so the
+    descendants of a class have contiguous ids and subtyping is a range check.
+
+    all the per class information is kept in lists indexed by class id:
+      names       class name
+      classes     Class ast node
+      parents     id of the parent class, -1 for Object
+      depths      distance from Object
+      max_descendants  highest id among the class and its descendants
+      attributes  Attr nodes in object layout order, inherited ones first
+      methods     (method name, implementing class name) in dispatch table order
+      method_slots  method name -> index in the dispatch table
+    ids maps a class name back to its id.
+
+    the dispatch table of a class starts with the one of its parent, with
+    overridden methods replaced in place, so a method has the same slot in
+    every class that inherits it.
+    """
+
+    def __init__(self, classes_dict, inheritance_graph):
+        definition_order = {name: i for i, name in enumerate(classes_dict)}
+        self.names = []
+        self.parents = []
+        self.depths = []
+        to_visit = [("Object", -1)]
+        while to_visit:
+            clname, parentid = to_visit.pop()
+            clid = len(self.names)
+            self.names.append(clname)
+            self.parents.append(parentid)
+            self.depths.append(0 if parentid == -1 else self.depths[parentid] + 1)
+            # children are numbered in the order they were defined
+            children = sorted(inheritance_graph.get(clname, ()), key=definition_order.get)
+            to_visit.extend((childc, clid) for childc in reversed(children))
+
+        self.ids = {name: clid for clid, name in enumerate(self.names)}
+        self.classes = [classes_dict[name] for name in self.names]
+        count = len(self.names)
+        self.max_descendants = list(range(count))
+        for clid in range(count - 1, 0, -1):
+            parentid = self.parents[clid]
+            self.max_descendants[parentid] = max(self.max_descendants[parentid], self.max_descendants[clid])
+
+        # pre-order visits parents first, so layouts can extend the parent one
+        self.attributes = [[] for _ in range(count)]
+        self.methods = [[] for _ in range(count)]
+        self.method_slots = [{} for _ in range(count)]
+        for clid in range(count):
+            self._layout(clid, self.parents[clid])
+
+    def _layout(self, clid, parentid):
+        cl = self.classes[clid]
+        if parentid == -1:
+            inherited_attrs = []
+            methods = []
+            slots = {}
+        else:
+            inherited_attrs = self.attributes[parentid]
+            methods = list(self.methods[parentid])
+            slots = dict(self.method_slots[parentid])
+        inherited_names = {attr.name for attr in inherited_attrs}
+        own_attrs = [feat for feat in cl.feature_list
+                     if isinstance(feat, Attr) and feat.name not in inherited_names]
+        self.attributes[clid] = inherited_attrs + own_attrs
+
+        for feat in cl.feature_list:
+            if isinstance(feat, Method) and feat.inherited_from is None:
+                if feat.name in slots:
+                    # overrides take the slot of the parent method
+                    methods[slots[feat.name]] = (feat.name, cl.name)
+                else:
+                    slots[feat.name] = len(methods)
+                    methods.append((feat.name, cl.name))
+        self.methods[clid] = methods
+        self.method_slots[clid] = slots
+
+    def __len__(self):
+        return len(self.names)
+
+    def conforms(self, childid, parentid):
+        """check whether class childid is parentid or one of its descendants"""
+        return parentid <= childid <= self.max_descendants[parentid]
+
+    def common_ancestor(self, firstid, secondid):
+        """id of the lowest class both classes inherit from"""
+        while not self.conforms(secondid, firstid):
+            firstid = self.parents[firstid]
+        return firstid
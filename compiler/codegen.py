@@ -1,14 +1,23 @@
 from .parser import Class, Method, Attr, Object, Int, Str, Block, Assign, \
         Dispatch, StaticDispatch, Plus, Sub, Mult, Div, Lt, Le, Eq, \
         If, While, Let, Case, New, Isvoid, Neg, Not, Bool
-import io
 import functools
+import io
 import compiler.memorymgr as mm
+from . import regalloc
+from .traversal import walk
+from .lowering import lower_program, default_value_label, UNBOXED_TYPES
+from .passes import run_passes
+from .constfold import fold_constants
+from . import ir
+from . import peephole
 
-code = io.StringIO()
+code = None  # file-like object the assembly is written to, set by cgen
 
 gc_functions = {
-    'NO_GC': ('_NoGC_Init', '_NoGC_Collect')
+    'NO_GC': ('_NoGC_Init', '_NoGC_Collect'),
+    'GEN_GC': ('_GenGC_Init', '_GenGC_Collect'),  # generational
+    'SCN_GC': ('_ScnGC_Init', '_ScnGC_Collect'),  # stop and copy
 }
 
 # support functions
@@ -28,7 +37,7 @@ def lines(lines):
 # end support
 
 
-def emit_global_data():
+def emit_global_data(class_table):
     """emit code for constants and global declarations"""
     line(".data")
     line(".align 2")
@@ -36,11 +45,11 @@ def emit_global_data():
     for g in globaldecls:
         line(".globl %s" % g)
     header("_int_tag")
-    line(".word 2")
+    line(".word %d" % class_table.ids["Int"])
     header("_bool_tag")
-    line(".word 3")
+    line(".word %d" % class_table.ids["Bool"])
     header("_string_tag")
-    line(".word 4")
+    line(".word %d" % class_table.ids["String"])
 
 def emit_select_gc(type_of_gc, test_mode=False):
     """emit code that selects the type of garbage collection we want"""
@@ -60,37 +69,47 @@ def emit_select_gc(type_of_gc, test_mode=False):
     else:
         line(".word 0")
 
+    if type_of_gc != "NO_GC":
+        # a word being boxed waits here while the runtime allocates
+        header("boxed_word")
+        line(".word 0")
+
 
 def traverse_for_symbols(expression, strhandle, inthandle):
+    walk(_traverse_for_symbols, expression, strhandle, inthandle)
+
+
+def _traverse_for_symbols(expression, strhandle, inthandle):
+    # generator visitor driven by walk, every yield traverses a sub-expression
     if any(isinstance(expression, X) for X in [Isvoid, Neg, Not]):
-        traverse_for_symbols(expression.body, strhandle, inthandle)
+        yield expression.body
     elif any(isinstance(expression, X) for X in [Eq, Lt, Le, Plus, Sub, Mult, Div]):
-        traverse_for_symbols(expression.first, strhandle, inthandle)
-        traverse_for_symbols(expression.second, strhandle, inthandle)
+        yield expression.first
+        yield expression.second
     elif isinstance(expression, While):
-        traverse_for_symbols(expression.predicate, strhandle, inthandle)
-        traverse_for_symbols(expression.body, strhandle, inthandle)
+        yield expression.predicate
+        yield expression.body
     elif isinstance(expression, Let):
-        traverse_for_symbols(expression.init, strhandle, inthandle)
-        traverse_for_symbols(expression.body, strhandle, inthandle)
+        yield expression.init
+        yield expression.body
     elif isinstance(expression, Block):
         for expr in expression.body:
-            traverse_for_symbols(expr, strhandle, inthandle)
+            yield expr
     elif isinstance(expression, Assign):
-        traverse_for_symbols(expression.body, strhandle, inthandle)
-        traverse_for_symbols(expression.name, strhandle, inthandle)
+        yield expression.body
+        yield expression.name
     elif isinstance(expression, Dispatch) or isinstance(expression, StaticDispatch):
-        traverse_for_symbols(expression.body, strhandle, inthandle)
+        yield expression.body
         for expr in expression.expr_list:
-            traverse_for_symbols(expr, strhandle, inthandle)
+            yield expr
     elif isinstance(expression, If):
-        traverse_for_symbols(expression.predicate, strhandle, inthandle)
-        traverse_for_symbols(expression.then_body, strhandle, inthandle)
-        traverse_for_symbols(expression.else_body, strhandle, inthandle)
+        yield expression.predicate
+        yield expression.then_body
+        yield expression.else_body
     elif isinstance(expression, Case):
-        traverse_for_symbols(expression.expr, strhandle, inthandle)
+        yield expression.expr
         for case in expression.case_list:
-            traverse_for_symbols(case[2], strhandle, inthandle)
+            yield case[2]
     elif isinstance(expression, Int):
         inthandle(expression)
     elif isinstance(expression, Str):
@@ -113,6 +132,9 @@ def build_symbol_tables(ast):
 
     inthandle = functools.partial(handle, ints)
 
+    # default values for String and Int
+    strhandle(Str(""))
+    inthandle(Int(0))
     for cl in ast:
         clname = Str(cl.name)
         strhandle(clname)  # have class names in the string table
@@ -121,28 +143,35 @@ def build_symbol_tables(ast):
     return strings, ints
 
 
-def emit_string_code(s, ints):
+def escape_string(content):
+    """escape a string so it can be used in a .ascii directive"""
+    for char, escaped in [("\\", "\\\\"), ("\"", "\\\""), ("\n", "\\n"), ("\t", "\\t")]:
+        content = content.replace(char, escaped)
+    return content
+
+
+def emit_string_code(s, ints, tag):
     line(".word -1")
     header("str_const%s" % id(s))
-    line(".word 4")  # string tag
+    line(".word %d" % tag)  # string tag
     line(".word %d" % (
         3 + # default obj fields
         1 + # string slots
-       (len(s) + 4) / 4  # obj size
+       (len(s.content) + 4) // 4  # obj size, including the terminating 0
     ))
     line(".word String_dispTab")
     len_obj = ints[len(s.content)]
     line(".word int_const%s" % id(len_obj))
     if len(s.content) > 0:
-        line(".ascii \"%s\"" % s.content)
+        line(".ascii \"%s\"" % escape_string(s.content))
     line(".byte 0")
     line(".align 2")
 
 
-def emit_int_code(s):
+def emit_int_code(s, tag):
     line(".word -1")
     header("int_const%s" % id(s))
-    line(".word 2")  # int tag
+    line(".word %d" % tag)  # int tag
     line(".word %d" % (
         3 + # default obj fields
         1 # int slots  FIXME check
@@ -151,10 +180,10 @@ def emit_int_code(s):
     line(".word %d" % s.content)
 
 
-def emit_bool_code(s):
+def emit_bool_code(s, tag):
     line(".word -1")
-    header("bool_const%s" % id(s))
-    line(".word 3")  # bool tag
+    header("bool_const%d" % s.content)
+    line(".word %d" % tag)  # bool tag
     line(".word %d" % (
         3 + # default obj fields
         1 # int slots  FIXME check
@@ -163,72 +192,165 @@ def emit_bool_code(s):
     line(".word %d" % s.content)
 
 
-def emit_symbol_tables_for_constants(strings, ints, bools):
+def used_constants(program):
+    """the string and int constants the program refers to"""
+    labels = set()
+    for function in program.functions:
+        for block in function.blocks:
+            for instruction in block.instructions:
+                if isinstance(instruction, ir.LoadConst):
+                    labels.add(instruction.label)
+    # class names of the objects that can exist, for type_name and abort
+    # messages, and of the functions reporting errors
+    names = {name for name in program.class_table.names if program.is_instantiated(name)}
+    names.update(function.classname for function in program.functions)
+    # default values in prototype objects
+    names.add("")
+    strings = {content: s for content, s in program.strings.items()
+               if content in names or "str_const%s" % id(s) in labels}
+    lengths = {len(content) for content in strings}
+    ints = {content: i for content, i in program.ints.items()
+            if content == 0 or content in lengths or "int_const%s" % id(i) in labels}
+    return strings, ints
+
+
+def emit_symbol_tables_for_constants(strings, ints, bools, class_table):
     """emit constants into the program layout, so they can be reused through-out the program"""
     for s in strings.values():
-        emit_string_code(s, ints)
+        emit_string_code(s, ints, class_table.ids["String"])
     for s in ints.values():
-        emit_int_code(s)
+        emit_int_code(s, class_table.ids["Int"])
     for s in bools.values():
-        emit_bool_code(s)
+        emit_bool_code(s, class_table.ids["Bool"])
 
 
-def emit_class_name_table(classes_dict, strings):
+def emit_class_name_table(program, strings):
     comment("class name lookup table (index -> classname)")
-    for clname, cl in classes_dict.items():
+    header("class_nameTab")
+    for clname in program.class_table.names:
+        comment(clname)
+        if program.is_instantiated(clname):
+            line(".word str_const%s" % id(strings[clname]))
+        else:
+            line(".word 0")  # no object has this tag
+
+def emit_class_max_tag_table(class_table):
+    comment("max descendant table (index -> highest class id in the subtree)")
+    comment("class tags are numbered in pre-order, so an object with tag t conforms")
+    comment("to class c when c <= t <= class_maxTagTab[c]")
+    line(".globl class_maxTagTab")
+    header("class_maxTagTab")
+    for clname, max_tag in zip(class_table.names, class_table.max_descendants):
         comment(clname)
-        line(".word str_const%s" % id(strings[clname]))
+        line(".word %s" % max_tag)
 
-def emit_inheritance_table(classes_dict, classes_list):
+def emit_inheritance_table(class_table):
     comment("inheritance table (index -> class id) maps to parent id")
     line(".globl InheritanceTable")
     header("InheritanceTable")
-    comment("class list: %s" % classes_list)
-    for clname, cl in classes_dict.items():
+    for clname, parentid in zip(class_table.names, class_table.parents):
         comment(clname)
-        parent = classes_dict.get(cl.parent)
-        if parent:
-            line(".word %s" % classes_list.index(parent.name))
+        line(".word %s" % parentid)  # -1 for Object
+
+
+def emit_class_object_table(program):
+    comment("class object table (index -> prototype object, init function)")
+    header("class_objTab")
+    defined = {function.name for function in program.functions}
+    for clname in program.class_table.names:
+        if program.is_instantiated(clname):
+            line(".word %s_protObj" % clname)
+            if "%s_init" % clname in defined:
+                line(".word %s_init" % clname)
+            else:
+                line(".word 0")  # only new SELF_TYPE calls it, and it was not reachable
         else:
             line(".word 0")
+            line(".word 0")
+
 
+def attribute_holds_word(program, attr):
+    """whether attr holds a word rather than a pointer"""
+    # the attributes of the base classes are named with an underscore, they
+    # keep the layout the runtime expects
+    return program.unboxed_attributes and attr.type in UNBOXED_TYPES and not attr.name.startswith("_")
 
-def emit_prototype_objects(classes_dict, classes_list):
+
+def emit_gc_maps(program):
+    comment("gc map table (index -> map of the attributes holding pointers)")
+    comment("a map is the number of attributes then one bit per attribute, 32 per word")
+    line(".globl class_gcMapTab")
+    header("class_gcMapTab")
+    for clname in program.class_table.names:
+        if program.is_instantiated(clname):
+            line(".word %s_gcMap" % clname)
+        else:
+            line(".word 0")
+    for clid, clname in enumerate(program.class_table.names):
+        if not program.is_instantiated(clname):
+            continue
+        attributes = program.class_table.attributes[clid]
+        header("%s_gcMap" % clname)
+        line(".word %d" % len(attributes))
+        for first in range(0, len(attributes), 32):
+            bits = 0
+            for i, attr in enumerate(attributes[first:first + 32]):
+                # the values of Int and Bool and the characters of String
+                if attr.type != "_prim_slot" and not attribute_holds_word(program, attr):
+                    bits |= 1 << i
+            line(".word %d" % bits)
+
+
+def emit_prototype_objects(program, strings, ints):
     comment("PROTOTYPE OBJECTS (memory state at instantiation)")
-    for clname, cl in classes_dict.items():
+    class_table = program.class_table
+    for clid, clname in enumerate(class_table.names):
+        if not program.is_instantiated(clname):
+            continue
         line(".word -1")  # GC marker
         header("%s_protObj" % clname)
-        line(".word %s" % classes_list.index(clname))
-        attr_count = len([x for x in cl.feature_list if isinstance(x, Attr)])
+        line(".word %s" % clid)
+        attributes = class_table.attributes[clid]
         line(".word {}".format(
              3 + # prot obj fixed size
-             attr_count
+             len(attributes)
         ))
         line(".word %s_dispTab" % clname)
-        for feat in cl.feature_list:
-            if isinstance(feat, Attr):
-                # print default values for attributes
-                if feat.type == "Int":
-                    line(".word 0")
-                elif feat.type == "Bool":
-                    line(".word 0")  # FIXME shall we init with False?
-                elif feat.type == "String":
-                    line("")
+        for feat in attributes:
+            # print default values for attributes
+            label = default_value_label(feat.type, strings, ints)
+            if label is None or attribute_holds_word(program, feat):
+                line(".word 0")
+            else:
+                line(".word %s" % label)
 
 
-def emit_dispatch_tables(classes_dict):
+def emit_dispatch_tables(program):
     comment("DISPATCH TABLES OBJECTS")
-    for clname, cl in classes_dict.items():
-        header("%s_dispTab" % clname)
+    class_table = program.class_table
+    defined = {function.name for function in program.functions}
+    for cl in class_table.classes:
         for feat in cl.feature_list:
-            if isinstance(feat, Method):
-                clname = feat.inherited_from
-                if clname is None:
-                    clname = cl.name
-                line(".word %s.%s" % (clname, feat.name))
+            if isinstance(feat, Method) and feat.body is None:
+                defined.add("%s.%s" % (cl.name, feat.name))  # implemented by the runtime
+    for clname, methods in zip(class_table.names, class_table.methods):
+        if not program.is_instantiated(clname):
+            continue
+        header("%s_dispTab" % clname)
+        for method_name, implementing_clname in methods:
+            label = "%s.%s" % (implementing_clname, method_name)
+            if label in defined:
+                line(".word %s" % label)
+            else:
+                line(".word 0")  # never called
+
+
+def method_offset(class_table, clname, method_name):
+    """offset of a method in the dispatch table of clname"""
+    return 4 * class_table.method_slots[class_table.ids[clname]][method_name]
 
 
-def code_global_text(classes_dict):
+def code_global_text(class_table):
     line(".globl heap_start")
     header("heap_start")
     line(".word 0")
@@ -240,53 +362,445 @@ def code_global_text(classes_dict):
     line(".globl Main.main")
 
 
-def emit_initialization_functions(classes_dict):
-    non_argument_frame_bytes = 12
-    stack_size = non_argument_frame_bytes
-    for clname, cl in classes_dict.items():
-        header("%s_init" % clname)
-        if cl.parent:
-            line("jal %s_init" % cl.parent)
+class Frame:
+    """where the temporaries of a function are while it runs"""
+
+    def __init__(self, function, program):
+        self.name = function.name
+        self.entry = function.blocks[0].label
+        self.classname = function.classname
+        self.argument_count = function.argument_count
+        intervals = ir.live_intervals(function)
+        uses_self = function.params[0] in intervals
+        for param in function.params:
+            intervals.pop(param, None)
+        crossing = regalloc.live_across_calls(function, intervals, program)
+        registers, spilled = regalloc.linear_scan(intervals, crossing)
+        # callee saved registers are restored before returning
+        self.saved_registers = ["$s0"] if uses_self else []
+        self.saved_registers += sorted(set(registers.values()) & set(regalloc.CALLEE_SAVED))
+        slots, slot_count = mm.assign_slots(spilled)
+        self.locations = dict(registers)
+        for temp, slot in slots.items():
+            self.locations[temp] = mm.slot_operand(slot, len(self.saved_registers))
+        self.locations[function.params[0]] = "$s0"
+        for i, param in enumerate(function.params[1:]):
+            self.locations[param] = mm.argument_operand(i, function.argument_count)
+        outgoing_count = 0
+        for block in function.blocks:
+            for instruction in block.instructions:
+                if isinstance(instruction, ir.Call) or isinstance(instruction, ir.VirtualCall):
+                    outgoing_count = max(outgoing_count, len(instruction.args) - 1)
+        self.size = mm.frame_size(len(self.saved_registers), slot_count, outgoing_count)
+        program.statistics["temporaries in registers"] = \
+            program.statistics.get("temporaries in registers", 0) + len(registers)
+        program.statistics["spilled temporaries"] = \
+            program.statistics.get("spilled temporaries", 0) + len(spilled)
+
+    def source(self, temp, scratch):
+        """register holding temp, it is loaded in scratch when in memory"""
+        location = self.locations[temp]
+        if location.startswith("$"):
+            return location
+        line("lw %s, %s" % (scratch, location))
+        return scratch
+
+    def load(self, register, temp):
+        """load temp exactly in register"""
+        location = self.source(temp, register)
+        if location != register:
+            line("move %s, %s" % (register, location))
+
+    def target(self, temp, scratch):
+        """register to compute temp in, to be passed to store afterwards"""
+        location = self.locations[temp]
+        if location.startswith("$"):
+            return location
+        return scratch
+
+    def store(self, temp, register):
+        location = self.locations[temp]
+        if not location.startswith("$"):
+            line("sw %s, %s" % (register, location))
+        elif location != register:
+            line("move %s, %s" % (location, register))
+
+
+def emit_prologue(frame, clear=False):
+    """set up the frame and save the registers it uses, with clear the words
+    below the saved registers are zeroed"""
+    lines([
+        "sw $fp, 0($sp) # store frame pointer in top-most portion of stack",
+        "move $fp, $sp",
+        "addiu $sp, $sp, -%d" % frame.size,
+        "sw $ra, -4($fp)",
+    ])
+    for i, register in enumerate(frame.saved_registers):
+        line("sw %s, %s" % (register, mm.saved_register_operand(i)))
+    if "$s0" in frame.saved_registers:
+        line("move $s0, $a0")  # self
+    if clear:
+        # collectors take every word of the stack that looks like a pointer
+        # for a root, a value left by an earlier frame may be a stale one
+        for offset in range(mm.FRAME_HEADER_SIZE + 4 * len(frame.saved_registers), frame.size, 4):
+            line("sw $zero, -%d($fp)" % offset)
+
+
+def emit_epilogue(frame):
+    line("lw $ra, -4($fp)")
+    for i, register in enumerate(frame.saved_registers):
+        line("lw %s, %s" % (register, mm.saved_register_operand(i)))
+    lines([
+        "addi $sp, $fp, %d" % (4 * frame.argument_count),  # the callee pops the arguments
+        "lw $fp, 0($fp)",
+        "jr $ra",
+    ])
+
+
+# objects of more words are copied by Object.copy
+INLINE_ALLOCATION_WORDS = 16
+
+
+def emit_allocation(typename, word_count, program):
+    """copy of the prototype object of typename, word_count words long, in $a0
+
+    the runtime allocates from $gp up to the limit in $s7, every object
+    being preceded by a -1 eyecatcher. Small objects are copied inline and
+    the runtime is only called when the heap is full."""
+    if program.gc_test or word_count > INLINE_ALLOCATION_WORDS:
+        # in test mode the runtime collects at every allocation
         lines([
-            "sw $fp,  0($sp) # store frame pointer in top-most portion of stack",
-            "move $fp, $sp",
+            "la $a0, %s_protObj" % typename,
+            "jal Object.copy",
         ])
-        mm.enter_frame()
-        line(mm.codestack_push(stack_size))
+        return
+    full, done = ir.new_label(), ir.new_label()
+    lines([
+        "addiu $t1, $gp, %d" % (4 * (word_count + 1)),
+        "bgtu $t1, $s7, %s" % full,
+        "li $t2, -1",
+        "sw $t2, 0($gp)",
+        "addiu $a0, $gp, 4",
+        "move $gp, $t1",
+        "la $t1, %s_protObj" % typename,
+    ])
+    for i in range(word_count):
         lines([
-            "sw $ra,  -4($fp)", # store ra and s0
-            "sw $s0,  -8($fp)",
+            "lw $t2, %d($t1)" % (4 * i),
+            "sw $t2, %d($a0)" % (4 * i),
         ])
-        for feat in cl.feature_list:
-            if isinstance(feat, Attr):
-                if feat.body is None:
-                    comment("no init value for %s" % feat.name)
-                else:
-                    comment("init-ed value for %s" % feat.name)
-
-
-
-def cgen(ast, classes_dict):
-    """main function for code generation"""
-    comment("start of generated code")
-    emit_global_data()
-    emit_select_gc("NO_GC")
-
-    strings, ints = build_symbol_tables(ast)
-    bools = {False: Bool(False), True: Bool(True)}
-
-    emit_symbol_tables_for_constants(strings, ints, bools)
-    emit_class_name_table(classes_dict, strings)
-
-    classes_list = list(classes_dict.keys())  # use this list indexes to refer to classes
-
-    emit_inheritance_table(classes_dict, classes_list)  # FIXME check this
-    emit_prototype_objects(classes_dict, classes_list)
-    emit_dispatch_tables(classes_dict)
-
-    code_global_text(classes_dict)
-    emit_initialization_functions(classes_dict)
-
-    return code
+    line("b %s" % done)
+    header(full)
+    lines([
+        "la $a0, %s_protObj" % typename,
+        "jal Object.copy",  # collects garbage or grows the heap
+    ])
+    header(done)
+
+
+binop_instructions = {
+    "add": "add", "sub": "sub", "mul": "mul", "div": "div",
+    "lt": "slt", "le": "sle", "eq": "seq", "sll": "sll", "sra": "sra",
+    "srl": "srl",
+}
+branch_instructions = {
+    "eq": "beq", "ne": "bne", "lt": "blt", "le": "ble", "gt": "bgt", "ge": "bge",
+    "leu": "bleu", "gtu": "bgtu",
+}
+negated_branches = {
+    "eq": "ne", "ne": "eq", "lt": "ge", "ge": "lt", "le": "gt", "gt": "le",
+    "leu": "gtu", "gtu": "leu",
+}
 
 
+def emit_branch(op, first, second, target):
+    if second == 0 and op in ("eq", "ne"):
+        line("%sz %s, %s" % (branch_instructions[op], first, target))
+    else:
+        line("%s %s, %s, %s" % (branch_instructions[op], first, second, target))
+
+
+def emit_call(instruction, frame, program):
+    args = instruction.args
+    argument_count = len(args) - 1
+    for i, arg in enumerate(args[1:]):
+        line("sw %s, %s" % (frame.source(arg, "$t0"), mm.outgoing_operand(i, argument_count)))
+    target = None
+    if isinstance(instruction, ir.Call) and isinstance(instruction.target, ir.Temp):
+        target = frame.source(instruction.target, "$t1")
+    frame.load("$a0", args[0])
+    if isinstance(instruction, ir.VirtualCall):
+        lines([
+            "lw $t1, 8($a0)",  # dispatch table
+            "lw $t1, %d($t1)" % method_offset(program.class_table, instruction.type, instruction.method),
+            "jalr $t1",
+        ])
+    elif target is not None:
+        line("jalr %s" % target)
+    else:
+        line("jal %s" % instruction.target)
+    if argument_count:
+        line("addiu $sp, $fp, -%d" % frame.size)  # the callee popped the arguments
+    frame.store(instruction.dest, "$a0")
+
+
+def reuses_frame(instruction, frame):
+    """whether the code of instruction jumps to the callee in the frame of
+    the caller, the Return following it is then never reached"""
+    if not isinstance(instruction, (ir.Call, ir.VirtualCall)) or not instruction.tail:
+        return False
+    # the arguments of the callee must fit where the ones of the caller are
+    return len(instruction.args) - 1 <= frame.argument_count
+
+
+def emit_tail_call(instruction, frame, program):
+    """jump to the callee, which returns directly to the caller of the
+    running function
+
+    the arguments are written to the outgoing area first, then copied over
+    the ones of the running function: they may be computed from them."""
+    args = instruction.args
+    argument_count = len(args) - 1
+    for i, arg in enumerate(args[1:]):
+        line("sw %s, %s" % (frame.source(arg, "$t0"), mm.outgoing_operand(i, argument_count)))
+    if isinstance(instruction, ir.Call) and instruction.target == frame.name:
+        # recursion becomes a loop back to the entry block, the frame is kept
+        for i in range(argument_count):
+            lines([
+                "lw $t0, %s" % mm.outgoing_operand(i, argument_count),
+                "sw $t0, %s" % mm.argument_operand(i, argument_count),
+            ])
+        if "$s0" in frame.saved_registers:
+            frame.load("$s0", args[0])
+        line("b %s" % frame.entry)
+        return
+    frame.load("$a0", args[0])
+    if isinstance(instruction, ir.VirtualCall):
+        lines([
+            "lw $t1, 8($a0)",  # dispatch table
+            "lw $t1, %d($t1)" % method_offset(program.class_table, instruction.type, instruction.method),
+        ])
+    elif isinstance(instruction.target, ir.Temp):
+        frame.load("$t1", instruction.target)
+    # the last arguments of the caller are replaced, the callee pops them
+    # all when it returns
+    for i in range(argument_count):
+        lines([
+            "lw $t0, %s" % mm.outgoing_operand(i, argument_count),
+            "sw $t0, %s" % mm.argument_operand(i, frame.argument_count),
+        ])
+    line("lw $ra, -4($fp)")
+    for i, register in enumerate(frame.saved_registers):
+        line("lw %s, %s" % (register, mm.saved_register_operand(i)))
+    lines([
+        "addiu $sp, $fp, %d" % (4 * (frame.argument_count - argument_count)),
+        "lw $fp, 0($fp)",
+    ])
+    if isinstance(instruction, ir.Call) and not isinstance(instruction.target, ir.Temp):
+        line("j %s" % instruction.target)
+    else:
+        line("jr $t1")
+
+
+def emit_instruction(instruction, frame, program, next_label):
+    """emit the code of an instruction, next_label is the block that follows"""
+    if isinstance(instruction, ir.LoadConst):
+        register = frame.target(instruction.dest, "$t0")
+        line("la %s, %s" % (register, instruction.label))
+        frame.store(instruction.dest, register)
+    elif isinstance(instruction, ir.LoadImm):
+        register = frame.target(instruction.dest, "$t0")
+        line("li %s, %d" % (register, instruction.value))
+        frame.store(instruction.dest, register)
+    elif isinstance(instruction, ir.Move):
+        if frame.locations[instruction.dest] != frame.locations[instruction.src]:
+            frame.store(instruction.dest, frame.source(instruction.src, "$t0"))
+    elif isinstance(instruction, ir.LoadField):
+        obj = frame.source(instruction.obj, "$t0")
+        register = frame.target(instruction.dest, "$t1")
+        line("lw %s, %d(%s)" % (register, instruction.offset, obj))
+        frame.store(instruction.dest, register)
+    elif isinstance(instruction, ir.StoreField):
+        obj = frame.source(instruction.obj, "$t0")
+        value = frame.source(instruction.src, "$t1")
+        line("sw %s, %d(%s)" % (value, instruction.offset, obj))
+        if program.gc == "GEN_GC" and not instruction.word:
+            # write barrier, the old generation may now point to the new one
+            lines([
+                "addiu $a1, %s, %d" % (obj, instruction.offset),
+                "jal _GenGC_Assign",
+            ])
+    elif isinstance(instruction, ir.BinOp):
+        first = frame.source(instruction.first, "$t0")
+        second = instruction.second
+        if isinstance(second, ir.Temp):
+            second = frame.source(second, "$t1")
+        register = frame.target(instruction.dest, "$t2")
+        line("%s %s, %s, %s" % (binop_instructions[instruction.op], register, first, second))
+        frame.store(instruction.dest, register)
+    elif isinstance(instruction, ir.UnOp):
+        value = frame.source(instruction.src, "$t0")
+        register = frame.target(instruction.dest, "$t1")
+        if instruction.op == "neg":
+            line("neg %s, %s" % (register, value))
+        else:
+            line("xori %s, %s, 1" % (register, value))
+        frame.store(instruction.dest, register)
+    elif isinstance(instruction, ir.Box):
+        if instruction.type == "Int" and program.gc != "NO_GC":
+            # the collector must find the word neither in the frame nor in
+            # a saved register
+            line("sw %s, boxed_word" % frame.source(instruction.src, "$t0"))
+            emit_allocation("Int", 4, program)
+            lines([
+                "lw $t0, boxed_word",
+                "sw $t0, 12($a0)",
+            ])
+            frame.store(instruction.dest, "$a0")
+        elif instruction.type == "Int":
+            emit_allocation("Int", 4, program)
+            line("sw %s, 12($a0)" % frame.source(instruction.src, "$t0"))
+            frame.store(instruction.dest, "$a0")
+        else:
+            value = frame.source(instruction.src, "$t0")
+            done = ir.new_label()
+            lines([
+                "la $t1, bool_const1",
+                "bnez %s, %s" % (value, done),
+                "la $t1, bool_const0",
+            ])
+            header(done)
+            frame.store(instruction.dest, "$t1")
+    elif isinstance(instruction, ir.Unbox):
+        obj = frame.source(instruction.src, "$t0")
+        register = frame.target(instruction.dest, "$t1")
+        line("lw %s, 12(%s)" % (register, obj))
+        frame.store(instruction.dest, register)
+    elif isinstance(instruction, ir.Equal):
+        frame.load("$t1", instruction.first)
+        frame.load("$t2", instruction.second)
+        done = ir.new_label()
+        lines([
+            "la $a0, bool_const1",
+            "beq $t1, $t2, %s" % done,
+            "la $a1, bool_const0",
+            "jal equality_test",
+        ])
+        header(done)
+        register = frame.target(instruction.dest, "$t1")
+        line("lw %s, 12($a0)" % register)
+        frame.store(instruction.dest, register)
+    elif isinstance(instruction, ir.Alloc):
+        class_table = program.class_table
+        word_count = 3 + len(class_table.attributes[class_table.ids[instruction.type]])
+        emit_allocation(instruction.type, word_count, program)
+        frame.store(instruction.dest, "$a0")
+    elif isinstance(instruction, ir.Call) or isinstance(instruction, ir.VirtualCall):
+        emit_call(instruction, frame, program)
+    elif isinstance(instruction, ir.CheckVoid):
+        not_void = ir.new_label()
+        line("bnez %s, %s" % (frame.source(instruction.src, "$t0"), not_void))
+        lines([
+            # the ast has no file names or line numbers, report the class name
+            "la $a0, str_const%s" % id(program.strings[frame.classname]),
+            "li $t1, 0",
+            "jal %s" % instruction.routine,
+        ])
+        header(not_void)
+    elif isinstance(instruction, ir.Jump):
+        if instruction.target != next_label:
+            line("b %s" % instruction.target)
+    elif isinstance(instruction, ir.Branch):
+        first = frame.source(instruction.first, "$t0")
+        second = instruction.second
+        if isinstance(second, ir.Temp):
+            second = frame.source(second, "$t1")
+        if instruction.if_true == next_label:
+            emit_branch(negated_branches[instruction.op], first, second, instruction.if_false)
+        else:
+            emit_branch(instruction.op, first, second, instruction.if_true)
+            if instruction.if_false != next_label:
+                line("b %s" % instruction.if_false)
+    elif isinstance(instruction, ir.Return):
+        frame.load("$a0", instruction.src)
+        emit_epilogue(frame)
+    elif isinstance(instruction, ir.CaseAbort):
+        frame.load("$a0", instruction.src)
+        line("jal _case_abort")  # no branch for the class of the object in $a0
+
+
+def emit_function(function, program):
+    """emit the code of a function, passed through the peephole optimizer"""
+    global code
+    out, code = code, io.StringIO()
+    try:
+        frame = Frame(function, program)
+        header(function.name)
+        emit_prologue(frame, program.gc != "NO_GC")
+        for i, block in enumerate(function.blocks):
+            next_label = None
+            if i + 1 < len(function.blocks):
+                next_label = function.blocks[i + 1].label
+            header(block.label)
+            for instruction in block.instructions:
+                if reuses_frame(instruction, frame):
+                    emit_tail_call(instruction, frame, program)
+                    break
+                emit_instruction(instruction, frame, program, next_label)
+        items = peephole.optimize(peephole.parse(code.getvalue()), program.statistics)
+    finally:
+        code = out
+    code.write(peephole.format_items(items))
+
+
+def cgen(ast, class_table, out, ir_dump=None, pass_timings=None, statistics=None,
+         unboxed_attributes=False, gc="NO_GC", gc_test=False):
+    """main function for code generation
+
+    sections are written to the file-like out as soon as they are generated,
+    nothing is kept in memory after returning. The intermediate
+    representation is written to the file-like ir_dump after every pass, the
+    time spent in each pass is collected in the dict pass_timings and the
+    counters reported by the passes in the dict statistics. With
+    unboxed_attributes, Int and Bool attributes hold words and a gc map
+    tells the pointers from the words in every object, only without a
+    collector. gc selects the garbage collector of the runtime, gc_test
+    makes it collect at every allocation."""
+    if unboxed_attributes and gc != "NO_GC":
+        # the collectors of the runtime do not read the gc maps yet
+        raise ValueError("unboxed attributes cannot be used with the %s collector" % gc)
+    global code
+    code = out
+    ir.reset_labels()
+    try:
+        comment("start of generated code")
+        emit_global_data(class_table)
+        emit_select_gc(gc, gc_test)
+
+        fold_constants(class_table)
+        strings, ints = build_symbol_tables(class_table.classes)
+        bools = {False: Bool(False), True: Bool(True)}
+        program = lower_program(class_table, strings, ints, unboxed_attributes)
+        program.gc = gc
+        program.gc_test = gc_test
+        run_passes(program, ir_dump, pass_timings)
+        strings, ints = used_constants(program)
+
+        emit_symbol_tables_for_constants(strings, ints, bools, class_table)
+        emit_class_name_table(program, strings)
+        emit_class_object_table(program)
+        emit_class_max_tag_table(class_table)
+
+        emit_inheritance_table(class_table)
+        emit_prototype_objects(program, strings, ints)
+        if unboxed_attributes:
+            emit_gc_maps(program)
+        emit_dispatch_tables(program)
+
+        code_global_text(class_table)
+        for function in program.functions:
+            emit_function(function, program)
+        if statistics is not None:
+            statistics.update(program.statistics)
+    finally:
+        code = None
@@ -0,0 +1,199 @@
+"""constant folding on the type checked ast
+
+runs after semant: operations on Int and Bool literals are computed at
+compile time, let variables bound to a literal and never assigned are
+replaced by the literal, and ifs with a literal predicate keep only the
+branch taken. codegen.build_symbol_tables runs on the folded ast, so the
+folded literals end up in the constant tables.
+"""
+from .parser import Method, Attr, Object, Int, Str, Block, Assign, \
+        Dispatch, StaticDispatch, Plus, Sub, Mult, Div, Lt, Le, Eq, \
+        If, While, Let, Case, Isvoid, Neg, Not, Bool
+from .semant import VariablesScopeDict
+from .traversal import walk
+
+literal_types = {Int: "Int", Bool: "Bool", Str: "String"}
+
+
+def literal(kind, content):
+    node = kind(content)
+    node.return_type = literal_types[kind]
+    return node
+
+
+def rebuild(node, **fields):
+    """copy of node with some fields changed, keeping the inferred type"""
+    copied = node._replace(**fields)
+    copied.__dict__.update(node.__dict__)
+    return copied
+
+
+def wrap(value):
+    """value as a 32 bit signed integer, like the machine computes it"""
+    return (value + 2 ** 31) % 2 ** 32 - 2 ** 31
+
+
+def fold_arithmetic(kind, first, second):
+    """folded value, None when it must be left to the runtime"""
+    if kind is Plus:
+        return wrap(first + second)
+    elif kind is Sub:
+        return wrap(first - second)
+    elif kind is Mult:
+        return wrap(first * second)
+    elif second == 0:
+        return None
+    # the machine truncates towards zero
+    quotient = abs(first) // abs(second)
+    return wrap(quotient if (first < 0) == (second < 0) else -quotient)
+
+
+def assigned_names(expression):
+    """names of the variables assigned anywhere in expression"""
+    names = set()
+    walk(_assigned_names, expression, names)
+    return names
+
+
+def _assigned_names(expression, names):
+    if isinstance(expression, Assign):
+        names.add(expression.name.name)
+    if isinstance(expression, list):
+        for item in expression:
+            yield item
+    elif isinstance(expression, tuple) and hasattr(expression, "_fields"):
+        for item in expression:
+            yield item
+    elif isinstance(expression, tuple):
+        # case branches
+        yield expression[2]
+
+
+def fold_expression(expression, assigned):
+    """folded copy of expression, assigned has the variables never
+    replaced by their value"""
+    constants = VariablesScopeDict()
+    return walk(_fold_expression, expression, constants, assigned)
+
+
+def _fold_expression(expression, constants, assigned):
+    # generator visitor driven by walk, every yield gives back the folded
+    # sub-expression; constants maps variables in scope to their literal
+    # value, None when they are not constant
+    if isinstance(expression, Object):
+        try:
+            value = constants[expression.name]
+        except KeyError:
+            value = None
+        return expression if value is None else value
+    elif any(isinstance(expression, X) for X in [Plus, Sub, Mult, Div]):
+        first = yield expression.first
+        second = yield expression.second
+        if isinstance(first, Int) and isinstance(second, Int):
+            value = fold_arithmetic(type(expression), first.content, second.content)
+            if value is not None:
+                return literal(Int, value)
+        return rebuild(expression, first=first, second=second)
+    elif any(isinstance(expression, X) for X in [Lt, Le, Eq]):
+        first = yield expression.first
+        second = yield expression.second
+        if isinstance(first, Int) and isinstance(second, Int):
+            if isinstance(expression, Lt):
+                return literal(Bool, first.content < second.content)
+            elif isinstance(expression, Le):
+                return literal(Bool, first.content <= second.content)
+            return literal(Bool, first.content == second.content)
+        if isinstance(expression, Eq) and type(first) is type(second) and type(first) in (Bool, Str):
+            return literal(Bool, first.content == second.content)
+        return rebuild(expression, first=first, second=second)
+    elif isinstance(expression, Neg):
+        body = yield expression.body
+        if isinstance(body, Int):
+            return literal(Int, wrap(-body.content))
+        return rebuild(expression, body=body)
+    elif isinstance(expression, Not):
+        body = yield expression.body
+        if isinstance(body, Bool):
+            return literal(Bool, not body.content)
+        return rebuild(expression, body=body)
+    elif isinstance(expression, If):
+        predicate = yield expression.predicate
+        if isinstance(predicate, Bool):
+            # the branch not taken is dead
+            return (yield expression.then_body if predicate.content else expression.else_body)
+        then_body = yield expression.then_body
+        else_body = yield expression.else_body
+        return rebuild(expression, predicate=predicate, then_body=then_body, else_body=else_body)
+    elif isinstance(expression, Let):
+        init = None
+        if expression.init is not None:
+            init = yield expression.init
+        constant = None
+        if type(init) in literal_types and literal_types[type(init)] == expression.type \
+                and expression.object not in assigned:
+            constant = init
+        constants.new_scope()
+        constants[expression.object] = constant
+        body = yield expression.body
+        constants.destroy_scope()
+        if constant is not None:
+            return body  # every use of the variable was replaced
+        folded = rebuild(expression, init=init, body=body)
+        # a pruned if may have left the body with a narrower type
+        folded.return_type = body.return_type
+        return folded
+    elif isinstance(expression, Case):
+        expr = yield expression.expr
+        case_list = []
+        for name, typename, body in expression.case_list:
+            constants.new_scope()
+            constants[name] = None
+            case_list.append((name, typename, (yield body)))
+            constants.destroy_scope()
+        return rebuild(expression, expr=expr, case_list=case_list)
+    elif isinstance(expression, Block):
+        body = []
+        for expr in expression.body:
+            body.append((yield expr))
+        folded = rebuild(expression, body=body)
+        folded.return_type = body[-1].return_type
+        return folded
+    elif isinstance(expression, Assign):
+        return rebuild(expression, body=(yield expression.body))
+    elif isinstance(expression, While):
+        predicate = yield expression.predicate
+        return rebuild(expression, predicate=predicate, body=(yield expression.body))
+    elif isinstance(expression, Isvoid):
+        return rebuild(expression, body=(yield expression.body))
+    elif isinstance(expression, Dispatch) or isinstance(expression, StaticDispatch):
+        body = expression.body
+        if body != "self":
+            body = yield body
+        expr_list = []
+        for expr in expression.expr_list:
+            expr_list.append((yield expr))
+        return rebuild(expression, body=body, expr_list=expr_list)
+    return expression
+
+
+def fold_constants(class_table):
+    """fold the bodies of the methods and attribute initializers of all the
+    classes, in place"""
+    # inherited attributes are shared with the parent class, they are folded
+    # once: id of the attribute -> (attribute, folded attribute)
+    folded_attrs = {}
+    for cl in class_table.classes:
+        for i, feat in enumerate(cl.feature_list):
+            if isinstance(feat, Method) and feat.inherited_from is None and feat.body is not None:
+                # formals and attributes are not let variables, they are never replaced
+                assigned = assigned_names(feat.body)
+                cl.feature_list[i] = rebuild(feat, body=fold_expression(feat.body, assigned))
+            elif isinstance(feat, Attr) and feat.body is not None:
+                if id(feat) not in folded_attrs:
+                    assigned = assigned_names(feat.body)
+                    folded_attrs[id(feat)] = (feat, feat._replace(body=fold_expression(feat.body, assigned)))
+                cl.feature_list[i] = folded_attrs[id(feat)][1]
+    for attributes in class_table.attributes:
+        for i, attr in enumerate(attributes):
+            if id(attr) in folded_attrs:
+                attributes[i] = folded_attrs[id(attr)][1]
@@ -0,0 +1,29 @@
+"""devirtualization of dispatches
+
+a dispatch whose receiver can only be of classes sharing the same
+implementation of the method is replaced by a direct call to it. The
+possible classes are the static type of the receiver and its subclasses,
+restricted to the ones instantiated when reachability ran before.
+"""
+from . import ir
+from .reachability import dispatch_targets
+
+
+def devirtualize(program):
+    """replace the dispatches with a single target by direct calls"""
+    table = program.class_table
+    dispatches = 0
+    devirtualized = 0
+    for function in program.functions:
+        for block in function.blocks:
+            for i, instruction in enumerate(block.instructions):
+                if not isinstance(instruction, ir.VirtualCall):
+                    continue
+                dispatches += 1
+                targets = dispatch_targets(table, instruction.type, instruction.method, program.is_instantiated)
+                # with no target the receiver is always void, the dispatch aborts
+                if len(targets) == 1:
+                    block.instructions[i] = ir.Call(instruction.dest, targets.pop(), instruction.args)
+                    devirtualized += 1
+    program.statistics["dispatches"] = dispatches
+    program.statistics["devirtualized dispatches"] = devirtualized
@@ -0,0 +1,98 @@
+"""inlining of small functions at their direct call sites
+
+runs after devirtualize, so the calls to getters, setters and trivial init
+functions are direct. The blocks of the callee are copied in the caller with
+fresh temporaries and labels: self becomes the receiver, the formals become
+temporaries initialized with the arguments, since a method may assign to
+them, and every Return moves its value to the destination of the call and
+jumps to the rest of the calling block.
+"""
+from . import ir
+
+# functions with more instructions are never inlined
+INLINE_SIZE_LIMIT = 12
+# instructions inlining may add to a single function
+INLINE_BUDGET = 64
+
+
+def function_size(function):
+    return sum(len(block.instructions) for block in function.blocks)
+
+
+def substitute(instruction, temps, labels):
+    """copy of instruction with its temporaries and labels renamed"""
+    fields = []
+    for field, value in zip(instruction._fields, instruction):
+        if isinstance(value, ir.Temp):
+            value = temps[value]
+        elif isinstance(value, list):
+            value = [temps[v] if isinstance(v, ir.Temp) else v for v in value]
+        elif field in ("target", "if_true", "if_false") and value in labels:
+            value = labels[value]
+        fields.append(value)
+    return type(instruction)(*fields)
+
+
+def inline_call(function, block_index, instruction_index, callee):
+    """replace the call at instruction_index of a block of function by the
+    body of callee"""
+    block = function.blocks[block_index]
+    call = block.instructions[instruction_index]
+    rest = function.new_block()
+    rest.instructions.extend(block.instructions[instruction_index + 1:])
+    del block.instructions[instruction_index:]
+
+    temps = {callee.params[0]: call.args[0]}
+    for param, arg in zip(callee.params[1:], call.args[1:]):
+        temps[param] = function.new_temp()
+        block.instructions.append(ir.Move(temps[param], arg))
+    for i in range(callee.temp_count):
+        temp = ir.Temp(i)
+        if temp not in temps:
+            temps[temp] = function.new_temp()
+    labels = {callee_block.label: ir.new_label() for callee_block in callee.blocks}
+    block.instructions.append(ir.Jump(labels[callee.blocks[0].label]))
+
+    inlined = []
+    for callee_block in callee.blocks:
+        instructions = [substitute(i, temps, labels) for i in callee_block.instructions]
+        if isinstance(instructions[-1], ir.Return):
+            instructions[-1:] = [ir.Move(call.dest, instructions[-1].src), ir.Jump(rest.label)]
+        inlined.append(ir.BasicBlock(labels[callee_block.label], instructions))
+    function.blocks[block_index + 1:block_index + 1] = inlined + [rest]
+
+
+def inline_function_calls(function, functions):
+    """inline the small callees of function until its budget is spent,
+    returns the number of calls inlined"""
+    budget = INLINE_BUDGET
+    inlined = 0
+    block_index = 0
+    # the blocks copied from a callee are visited too, their calls may be
+    # inlined as long as the budget allows
+    while block_index < len(function.blocks):
+        block = function.blocks[block_index]
+        for i, instruction in enumerate(block.instructions):
+            if not isinstance(instruction, ir.Call) or isinstance(instruction.target, ir.Temp):
+                continue
+            callee = functions.get(instruction.target)
+            # runtime functions are not in functions, recursion never ends
+            if callee is None or callee is function:
+                continue
+            size = function_size(callee)
+            if size <= INLINE_SIZE_LIMIT and size <= budget:
+                inline_call(function, block_index, i, callee)
+                budget -= size
+                inlined += 1
+                break
+        block_index += 1
+    return inlined
+
+
+def inline(program):
+    """inline small functions at their direct call sites"""
+    functions = {function.name: function for function in program.functions}
+    inlined = 0
+    for function in program.functions:
+        inlined += inline_function_calls(function, functions)
+    program.statistics["inlined calls"] = inlined
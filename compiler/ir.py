@@ -0,0 +1,272 @@
+"""three-address intermediate representation
+
+a Program holds one Function for every method with a body and for every
+init function. The body of a Function is a list of BasicBlock, the first one
+being the entry point; every block is a straight sequence of instructions
+ending with exactly one terminator (Jump, Branch, Return or CaseAbort).
+
+Instructions are namedtuples. Their `dest` field is the temporary they
+define, every other Temp found in their fields is a use. A temporary holds
+either a pointer to an object or, for the values inside Int and Bool objects,
+a plain machine word.
+"""
+from collections import namedtuple
+
+
+class Temp(namedtuple("Temp", "id")):
+    def __str__(self):
+        return "t%d" % self.id
+
+
+LoadConst = namedtuple("LoadConst", "dest, label")  # address of a static object
+LoadImm = namedtuple("LoadImm", "dest, value")  # machine word, 0 is void
+Move = namedtuple("Move", "dest, src")
+LoadField = namedtuple("LoadField", "dest, obj, offset")  # offset in bytes
+# word is set when src is not a pointer, collectors need not know about it
+StoreField = namedtuple("StoreField", "obj, offset, src, word", defaults=(False,))
+BinOp = namedtuple("BinOp", "dest, op, first, second")  # second is a Temp or an int
+UnOp = namedtuple("UnOp", "dest, op, src")
+Box = namedtuple("Box", "dest, type, src")  # Int or Bool object holding a word
+Unbox = namedtuple("Unbox", "dest, src")
+Equal = namedtuple("Equal", "dest, first, second")  # cool = on objects, 1 or 0
+Alloc = namedtuple("Alloc", "dest, type")  # copy of the prototype object
+# tail is set when the next instruction returns the result of the call, the
+# frame of the caller can then be reused by the callee
+Call = namedtuple("Call", "dest, target, args, tail", defaults=(False,))  # target is a label or a Temp
+VirtualCall = namedtuple("VirtualCall", "dest, type, method, args, tail", defaults=(False,))
+CheckVoid = namedtuple("CheckVoid", "src, routine")  # abort when src is void
+
+# the first argument of calls is the receiver, passed in $a0
+
+Jump = namedtuple("Jump", "target")
+Branch = namedtuple("Branch", "op, first, second, if_true, if_false")
+Return = namedtuple("Return", "src")
+CaseAbort = namedtuple("CaseAbort", "src")
+
+TERMINATORS = (Jump, Branch, Return, CaseAbort)
+
+BasicBlock = namedtuple("BasicBlock", "label, instructions")
+
+label_count = 0
+
+
+def new_label():
+    global label_count
+    label_count += 1
+    return "label%d" % label_count
+
+
+def reset_labels():
+    global label_count
+    label_count = 0
+
+
+class Function:
+    """code of a method or of an init function
+
+    params are the temporaries holding self and then the formals"""
+
+    def __init__(self, name, classname, argument_count):
+        self.name = name
+        self.classname = classname
+        self.temp_count = 0
+        self.params = [self.new_temp() for _ in range(argument_count + 1)]
+        self.blocks = []
+
+    def new_temp(self):
+        self.temp_count += 1
+        return Temp(self.temp_count - 1)
+
+    def new_block(self):
+        """a block that is not in the function yet"""
+        return BasicBlock(new_label(), [])
+
+    @property
+    def argument_count(self):
+        return len(self.params) - 1
+
+
+class Program:
+    """all the functions of the program, with the tables they refer to"""
+
+    def __init__(self, class_table, strings, ints):
+        self.class_table = class_table
+        self.strings = strings
+        self.ints = ints
+        self.functions = []
+        # counters reported by the passes, name -> value
+        self.statistics = {}
+        # names of the classes that may be instantiated, None when unknown
+        self.instantiated = None
+        # whether Int and Bool attributes hold words instead of objects
+        self.unboxed_attributes = False
+        # garbage collector the code is generated for, a key of
+        # codegen.gc_functions
+        self.gc = "NO_GC"
+        # whether the collector runs at every allocation
+        self.gc_test = False
+
+    def is_instantiated(self, classname):
+        return self.instantiated is None or classname in self.instantiated
+
+
+def defs(instruction):
+    dest = getattr(instruction, "dest", None)
+    return [] if dest is None else [dest]
+
+
+_operand_fields = {}
+
+
+def operand_fields(kind):
+    """indexes of the fields of an instruction type that may hold a use"""
+    if kind not in _operand_fields:
+        _operand_fields[kind] = [i for i, field in enumerate(kind._fields) if field != "dest"]
+    return _operand_fields[kind]
+
+
+def uses(instruction):
+    found = []
+    for i in operand_fields(type(instruction)):
+        value = instruction[i]
+        if isinstance(value, Temp):
+            found.append(value)
+        elif isinstance(value, list):
+            found.extend(v for v in value if isinstance(v, Temp))
+    return found
+
+
+def successors(block):
+    terminator = block.instructions[-1]
+    if isinstance(terminator, Jump):
+        return [terminator.target]
+    elif isinstance(terminator, Branch):
+        return [terminator.if_true, terminator.if_false]
+    return []
+
+
+def predecessors(function):
+    """labels of the blocks jumping to every block, by label"""
+    found = {block.label: [] for block in function.blocks}
+    for block in function.blocks:
+        for label in successors(block):
+            found[label].append(block.label)
+    return found
+
+
+def dominators(function):
+    """labels of the blocks every path from the entry block goes through
+    before reaching each block, by label, the block itself included"""
+    labels = [block.label for block in function.blocks]
+    preceding = predecessors(function)
+    dominating = {label: set(labels) for label in labels}
+    dominating[labels[0]] = {labels[0]}
+    changed = True
+    while changed:
+        changed = False
+        for label in labels[1:]:
+            found = set(labels)
+            for other in preceding[label]:
+                found &= dominating[other]
+            found.add(label)
+            if found != dominating[label]:
+                dominating[label] = found
+                changed = True
+    return dominating
+
+
+def liveness(function):
+    """temporaries live at the start and at the end of every block, by label"""
+    use_before_def = {}
+    defined = {}
+    for block in function.blocks:
+        used, killed = set(), set()
+        for instruction in block.instructions:
+            used.update(t for t in uses(instruction) if t not in killed)
+            killed.update(defs(instruction))
+        use_before_def[block.label] = used
+        defined[block.label] = killed
+
+    live_in = {block.label: set() for block in function.blocks}
+    live_out = {block.label: set() for block in function.blocks}
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(function.blocks):
+            out = set()
+            for label in successors(block):
+                out |= live_in[label]
+            new_in = use_before_def[block.label] | (out - defined[block.label])
+            if out != live_out[block.label] or new_in != live_in[block.label]:
+                live_out[block.label] = out
+                live_in[block.label] = new_in
+                changed = True
+    return live_in, live_out
+
+
+def live_intervals(function):
+    """for every temporary, the first and last position (counting
+    instructions in block order) where it may hold a value that is used"""
+    live_in, live_out = liveness(function)
+    intervals = {}
+
+    def extend(temp, position):
+        if temp in intervals:
+            start, end = intervals[temp]
+            intervals[temp] = (min(start, position), max(end, position))
+        else:
+            intervals[temp] = (position, position)
+
+    position = 0
+    for block in function.blocks:
+        for temp in live_in[block.label]:
+            extend(temp, position)
+        for instruction in block.instructions:
+            for temp in uses(instruction) + defs(instruction):
+                extend(temp, position)
+            position += 1
+        for temp in live_out[block.label]:
+            extend(temp, position - 1)
+    return intervals
+
+
+def remove_unreachable_blocks(function):
+    """drop the blocks that cannot be reached from the entry block"""
+    blocks = {block.label: block for block in function.blocks}
+    reachable = set()
+    to_visit = [function.blocks[0].label]
+    while to_visit:
+        label = to_visit.pop()
+        if label not in reachable:
+            reachable.add(label)
+            to_visit.extend(successors(blocks[label]))
+    function.blocks[:] = [block for block in function.blocks if block.label in reachable]
+
+
+def format_instruction(instruction):
+    operands = []
+    defaults = type(instruction)._field_defaults
+    for field, value in zip(instruction._fields, instruction):
+        if field == "dest" or (field in defaults and value == defaults[field]):
+            continue
+        if isinstance(value, list):
+            operands.append("[%s]" % ", ".join(str(v) for v in value))
+        else:
+            operands.append(str(value))
+    text = "%s %s" % (type(instruction).__name__, ", ".join(operands))
+    dest = getattr(instruction, "dest", None)
+    if dest is not None:
+        text = "%s = %s" % (dest, text)
+    return text
+
+
+def format_function(function):
+    lines = ["function %s(%s)" % (function.name, ", ".join(str(p) for p in function.params))]
+    for block in function.blocks:
+        lines.append("  %s:" % block.label)
+        lines.extend("    %s" % format_instruction(instruction) for instruction in block.instructions)
+    return "\n".join(lines) + "\n"
+
+
+def format_program(program):
+    return "".join(format_function(function) for function in program.functions)
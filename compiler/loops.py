@@ -0,0 +1,211 @@
+"""optimization of the loops of while expressions
+
+lowering computes everything inside the body of a loop on every iteration,
+even the constants and the values of attributes the loop never assigns. A
+loop is found from a jump back to a block dominating it, its header; the
+instructions of the loop whose operands do not change in it are moved to a
+new block that runs once before the header. The loop may run zero times, so
+only the instructions that cannot fail nor change anything are moved.
+
+multiplications and divisions by powers of two are replaced by shifts
+first, the shifts of a loop invariant value being themselves moved out.
+"""
+from . import ir
+from .unbox import is_pure, single_definitions, remove_useless_instructions
+
+# runtime methods that only read their receiver, which is never void:
+# they are called directly on a value of their own class
+PURE_METHODS = ("String.length",)
+
+
+def power_of_two(value):
+    """the exponent of value when it is a power of two, None otherwise"""
+    if isinstance(value, int) and value > 0 and value & (value - 1) == 0:
+        return value.bit_length() - 1
+    return None
+
+
+def constant(operand, definitions):
+    """the word held by operand, None if unknown"""
+    if isinstance(operand, int):
+        return operand
+    definition = definitions.get(operand)
+    if isinstance(definition, ir.LoadImm):
+        return definition.value
+    return None
+
+
+def reduced(function, instruction, definitions):
+    """the instructions computing instruction with shifts, None if it cannot
+    be reduced"""
+    first, second = instruction.first, instruction.second
+    if instruction.op == "mul":
+        shift = power_of_two(constant(second, definitions))
+        if shift is None:
+            # multiplication is commutative
+            first, second = second, first
+            shift = power_of_two(constant(second, definitions))
+        if shift is None or isinstance(first, int):
+            return None
+        if shift == 0:
+            return [ir.Move(instruction.dest, first)]
+        return [ir.BinOp(instruction.dest, "sll", first, shift)]
+    elif instruction.op == "div":
+        shift = power_of_two(constant(second, definitions))
+        if shift is None or isinstance(first, int):
+            return None
+        if shift == 0:
+            return [ir.Move(instruction.dest, first)]
+        # the machine truncates towards zero, an arithmetic shift rounds
+        # down: 2**shift - 1 is added to negative dividends first
+        sign, bias, biased = function.new_temp(), function.new_temp(), function.new_temp()
+        return [
+            ir.BinOp(sign, "sra", first, 31),
+            ir.BinOp(bias, "srl", sign, 32 - shift),
+            ir.BinOp(biased, "add", first, bias),
+            ir.BinOp(instruction.dest, "sra", biased, shift),
+        ]
+    return None
+
+
+def reduce_strength(program):
+    """replace the multiplications and divisions by powers of two"""
+    count = 0
+    for function in program.functions:
+        definitions = single_definitions(function)
+        changed = False
+        for block in function.blocks:
+            instructions = []
+            for instruction in block.instructions:
+                replacement = None
+                if isinstance(instruction, ir.BinOp):
+                    replacement = reduced(function, instruction, definitions)
+                if replacement is None:
+                    instructions.append(instruction)
+                else:
+                    instructions.extend(replacement)
+                    count += 1
+                    changed = True
+            block.instructions[:] = instructions
+        if changed:
+            # the constants are often left without uses
+            remove_useless_instructions(function)
+    program.statistics["strength reduced operations"] = count
+
+
+def natural_loops(function):
+    """the labels of the blocks of every loop, by label of its header"""
+    position = {block.label: i for i, block in enumerate(function.blocks)}
+    # every cycle has a jump to the same or an earlier block
+    if not any(position[label] <= position[block.label]
+               for block in function.blocks for label in ir.successors(block)):
+        return {}
+    dominating = ir.dominators(function)
+    preceding = ir.predecessors(function)
+    loops = {}
+    for block in function.blocks:
+        for header in ir.successors(block):
+            if header not in dominating[block.label]:
+                continue
+            body = loops.setdefault(header, {header})
+            to_visit = [block.label]
+            while to_visit:
+                label = to_visit.pop()
+                if label not in body:
+                    body.add(label)
+                    to_visit.extend(preceding[label])
+    return loops
+
+
+def may_be_hoisted(instruction, function, stored_offsets, calls):
+    """whether instruction can run before the loop, even if the loop would
+    never run it"""
+    if is_pure(instruction):
+        return True
+    elif isinstance(instruction, ir.LoadField):
+        # self is never void, the other objects may be
+        return instruction.obj == function.params[0] and not calls \
+            and instruction.offset not in stored_offsets
+    elif isinstance(instruction, ir.Call):
+        return instruction.target in PURE_METHODS
+    return False
+
+
+def invariant_instructions(function, loop, definitions):
+    """the instructions of loop computing the same value at every
+    iteration, in an order where they can run"""
+    blocks = [block for block in function.blocks if block.label in loop]
+    defined = set()
+    stored_offsets = set()
+    calls = False
+    for block in blocks:
+        for instruction in block.instructions:
+            defined.update(ir.defs(instruction))
+            if isinstance(instruction, ir.StoreField):
+                stored_offsets.add(instruction.offset)
+            elif isinstance(instruction, ir.VirtualCall):
+                calls = True
+            elif isinstance(instruction, ir.Call) and instruction.target not in PURE_METHODS:
+                calls = True  # the method may assign attributes
+    hoisted = []
+    invariant = set()
+    changed = True
+    while changed:
+        changed = False
+        for block in blocks:
+            for instruction in block.instructions:
+                dest = getattr(instruction, "dest", None)
+                # a temporary defined once keeps its value after the loop
+                if dest is None or dest in invariant or definitions.get(dest) is not instruction:
+                    continue
+                if not may_be_hoisted(instruction, function, stored_offsets, calls):
+                    continue
+                if all(temp in invariant or temp not in defined for temp in ir.uses(instruction)):
+                    invariant.add(dest)
+                    hoisted.append(instruction)
+                    changed = True
+    return hoisted
+
+
+def hoist_invariants(function, header, loop):
+    """move the invariant instructions of a loop to a block before its
+    header, returns how many were moved"""
+    definitions = single_definitions(function)
+    hoisted = invariant_instructions(function, loop, definitions)
+    if not hoisted:
+        return 0
+    moved = {id(instruction) for instruction in hoisted}
+    preheader = function.new_block()
+    preheader.instructions.extend(hoisted)
+    preheader.instructions.append(ir.Jump(header))
+    for block in function.blocks:
+        block.instructions[:] = [i for i in block.instructions if id(i) not in moved]
+        if block.label in loop:
+            continue
+        # the jumps entering the loop go through the new block
+        terminator = block.instructions[-1]
+        if isinstance(terminator, ir.Jump) and terminator.target == header:
+            block.instructions[-1] = ir.Jump(preheader.label)
+        elif isinstance(terminator, ir.Branch):
+            block.instructions[-1] = terminator._replace(
+                if_true=preheader.label if terminator.if_true == header else terminator.if_true,
+                if_false=preheader.label if terminator.if_false == header else terminator.if_false)
+    index = next(i for i, block in enumerate(function.blocks) if block.label == header)
+    function.blocks.insert(index, preheader)
+    return len(hoisted)
+
+
+def hoist_loop_invariants(program):
+    """move the invariant computations out of the loops, inner loops first"""
+    count = 0
+    for function in program.functions:
+        done = set()
+        while True:
+            loops = natural_loops(function)
+            remaining = [header for header in loops if header not in done]
+            if not remaining:
+                break
+            header = min(remaining, key=lambda label: len(loops[label]))
+            done.add(header)
+            count += hoist_invariants(function, header, loops[header])
+    program.statistics["hoisted instructions"] = count
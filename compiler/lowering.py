@@ -0,0 +1,395 @@
+"""lowering of the type checked ast to the intermediate representation
+
+the static type of an expression selects how its value is represented: Int
+and Bool values are plain machine words, every other value is a pointer to
+an object. Words are boxed in a new Int or Bool object only where they
+escape to something expecting an object: arguments, receivers and results of
+methods, attributes, and variables or expressions of a more general type.
+With the unboxed attribute layout, Int and Bool attributes hold words too.
+"""
+from .parser import Method, Object, Int, Str, Block, Assign, \
+        Dispatch, StaticDispatch, Plus, Sub, Mult, Div, Lt, Le, Eq, \
+        If, While, Let, Case, New, Isvoid, Neg, Not, Bool
+from .semant import VariablesScopeDict
+from .traversal import walk
+from . import ir
+
+
+UNBOXED_TYPES = ("Int", "Bool")
+
+
+def default_value_label(typename, strings, ints):
+    """label of the value of a variable of type typename that is not
+    initialized, None if it is void"""
+    if typename == "Int":
+        return "int_const%s" % id(ints[0])
+    elif typename == "Bool":
+        return "bool_const0"
+    elif typename == "String":
+        return "str_const%s" % id(strings[""])
+    return None
+
+
+class Environment:
+    """what lowering needs to know inside a function of a class"""
+
+    def __init__(self, cl, class_table, strings, ints, function, unboxed_attributes=False):
+        self.cl = cl
+        self.class_table = class_table
+        self.strings = strings
+        self.ints = ints
+        self.function = function
+        self.unboxed_attributes = unboxed_attributes
+        self.block = None  # where instructions are appended
+        # variable name -> Temp of locals and formals, offset of attributes
+        self.variables = VariablesScopeDict()
+        for i, attr in enumerate(class_table.attributes[class_table.ids[cl.name]]):
+            self.variables[attr.name] = 4 * (3 + i)
+
+    @property
+    def self_temp(self):
+        return self.function.params[0]
+
+    def static_class(self, typename):
+        """class whose features are used for an expression of type typename"""
+        if typename == "SELF_TYPE":
+            return self.cl.name
+        return typename
+
+    def box(self, value, typename):
+        """value of static type typename as a pointer to an object"""
+        if typename in UNBOXED_TYPES:
+            return self.define(ir.Box, typename, value)
+        return value
+
+    def unbox(self, value, typename):
+        """object of static type typename in the representation of the type"""
+        if typename in UNBOXED_TYPES:
+            return self.define(ir.Unbox, value)
+        return value
+
+    def coerce(self, value, typename, declared):
+        """value of static type typename in the representation of declared,
+        a type it conforms to"""
+        if declared in UNBOXED_TYPES:
+            return value  # only Int conforms to Int, only Bool to Bool
+        return self.box(value, typename)
+
+    def load_attribute(self, offset, typename):
+        """value of the attribute of self at offset, of type typename"""
+        value = self.define(ir.LoadField, self.self_temp, offset)
+        if self.unboxed_attributes:
+            return value
+        return self.unbox(value, typename)
+
+    def store_attribute(self, offset, value, typename):
+        if self.unboxed_attributes:
+            self.emit(ir.StoreField(self.self_temp, offset, value, typename in UNBOXED_TYPES))
+        else:
+            self.emit(ir.StoreField(self.self_temp, offset, self.box(value, typename)))
+
+    def emit(self, instruction):
+        self.block.instructions.append(instruction)
+
+    def define(self, kind, *operands):
+        """emit an instruction defining a new temporary, returning it"""
+        dest = self.function.new_temp()
+        self.emit(kind(dest, *operands))
+        return dest
+
+    def terminate(self, terminator):
+        self.emit(terminator)
+        self.block = None
+
+    def start(self, block):
+        self.function.blocks.append(block)
+        self.block = block
+
+
+arith_ops = {Plus: "add", Sub: "sub", Mult: "mul", Div: "div"}
+comparison_ops = {Lt: "lt", Le: "le"}
+
+# cases with more branches dispatch with a binary search on the class tag
+CASE_LINEAR_DISPATCH_BRANCHES = 4
+
+
+def case_intervals(branch_ranges):
+    """split class tags in contiguous intervals, each matched by the same
+    case branch
+
+    branch_ranges holds the (first, last) tags matched by each branch, in
+    source order. Returns a list of (first tag, branch index) sorted by tag,
+    with branch index None where no branch matches."""
+    bounds = {0}
+    for first, last in branch_ranges:
+        bounds.add(first)
+        bounds.add(last + 1)
+    intervals = []
+    for tag in sorted(bounds):
+        matching = [(first, -i) for i, (first, last) in enumerate(branch_ranges) if first <= tag <= last]
+        # tag ranges are nested or disjoint, the most specific branch is the
+        # innermost range, the one starting last
+        branch = -max(matching)[1] if matching else None
+        if not intervals or intervals[-1][1] != branch:
+            intervals.append((tag, branch))
+    return intervals
+
+
+def lower_tag_search(env, tag, intervals, targets):
+    """binary search of tag among intervals"""
+    if len(intervals) == 1:
+        env.terminate(ir.Jump(targets[intervals[0][1]]))
+        return
+    middle = len(intervals) // 2
+    lower_half, upper_half = env.function.new_block(), env.function.new_block()
+    env.terminate(ir.Branch("lt", tag, intervals[middle][0], lower_half.label, upper_half.label))
+    env.start(lower_half)
+    lower_tag_search(env, tag, intervals[:middle], targets)
+    env.start(upper_half)
+    lower_tag_search(env, tag, intervals[middle:], targets)
+
+
+def lower_case_dispatch(env, tag, branch_ranges, targets):
+    """jump to the label of the case branch matching the class tag,
+    targets[None] is jumped to when no branch matches"""
+    if len(branch_ranges) <= CASE_LINEAR_DISPATCH_BRANCHES:
+        # test the most specific classes first, each test is a range check
+        order = sorted(range(len(branch_ranges)), key=lambda i: -branch_ranges[i][0])
+        for i in order:
+            first, last = branch_ranges[i]
+            next_test = env.function.new_block()
+            offset = env.define(ir.BinOp, "sub", tag, first)
+            env.terminate(ir.Branch("leu", offset, last - first, targets[i], next_test.label))
+            env.start(next_test)
+        env.terminate(ir.Jump(targets[None]))
+    else:
+        lower_tag_search(env, tag, case_intervals(branch_ranges), targets)
+
+
+def lower_expression(expression, env):
+    """append the code evaluating expression to the current block, returning
+    the temporary holding the result"""
+    return walk(_lower_expression, expression, env)
+
+
+def _lower_expression(expression, env):
+    # generator visitor driven by walk, every yield lowers a sub-expression
+    # and gives back the temporary holding its value
+    if isinstance(expression, Int):
+        return env.define(ir.LoadImm, expression.content)
+    elif isinstance(expression, Str):
+        return env.define(ir.LoadConst, "str_const%s" % id(env.strings[expression.content]))
+    elif isinstance(expression, Bool):
+        return env.define(ir.LoadImm, int(expression.content))
+    elif isinstance(expression, Object):
+        if expression.name == "self":
+            return env.self_temp
+        location = env.variables[expression.name]
+        if isinstance(location, ir.Temp):
+            # a copy, the variable may be assigned before the value is used
+            return env.define(ir.Move, location)
+        return env.load_attribute(location, expression.return_type)
+    elif isinstance(expression, Assign):
+        value = yield expression.body
+        value = env.coerce(value, expression.body.return_type, expression.name.return_type)
+        location = env.variables[expression.name.name]
+        if isinstance(location, ir.Temp):
+            env.emit(ir.Move(location, value))
+        else:
+            env.store_attribute(location, value, expression.name.return_type)
+        return value
+    elif isinstance(expression, Block):
+        for expr in expression.body:
+            value = yield expr
+        return env.coerce(value, expression.body[-1].return_type, expression.return_type)
+    elif any(isinstance(expression, X) for X in [Plus, Sub, Mult, Div]):
+        first = yield expression.first
+        second = yield expression.second
+        return env.define(ir.BinOp, arith_ops[type(expression)], first, second)
+    elif isinstance(expression, Lt) or isinstance(expression, Le):
+        first = yield expression.first
+        second = yield expression.second
+        return env.define(ir.BinOp, comparison_ops[type(expression)], first, second)
+    elif isinstance(expression, Eq):
+        first = yield expression.first
+        second = yield expression.second
+        if expression.first.return_type in UNBOXED_TYPES:
+            # the other side has the same type
+            return env.define(ir.BinOp, "eq", first, second)
+        return env.define(ir.Equal, first, second)
+    elif isinstance(expression, Neg):
+        value = yield expression.body
+        return env.define(ir.UnOp, "neg", value)
+    elif isinstance(expression, Not):
+        value = yield expression.body
+        return env.define(ir.UnOp, "not", value)
+    elif isinstance(expression, Isvoid):
+        value = yield expression.body
+        if expression.body.return_type in UNBOXED_TYPES:
+            return env.define(ir.LoadImm, 0)
+        return env.define(ir.BinOp, "eq", value, 0)
+    elif isinstance(expression, If):
+        then_block, else_block, done = (env.function.new_block() for _ in range(3))
+        result = env.function.new_temp()
+        predicate = yield expression.predicate
+        env.terminate(ir.Branch("ne", predicate, 0, then_block.label, else_block.label))
+        env.start(then_block)
+        value = yield expression.then_body
+        env.emit(ir.Move(result, env.coerce(value, expression.then_body.return_type, expression.return_type)))
+        env.terminate(ir.Jump(done.label))
+        env.start(else_block)
+        value = yield expression.else_body
+        env.emit(ir.Move(result, env.coerce(value, expression.else_body.return_type, expression.return_type)))
+        env.terminate(ir.Jump(done.label))
+        env.start(done)
+        return result
+    elif isinstance(expression, While):
+        loop, body, done = (env.function.new_block() for _ in range(3))
+        env.terminate(ir.Jump(loop.label))
+        env.start(loop)
+        predicate = yield expression.predicate
+        env.terminate(ir.Branch("ne", predicate, 0, body.label, done.label))
+        env.start(body)
+        yield expression.body
+        env.terminate(ir.Jump(loop.label))
+        env.start(done)
+        return env.define(ir.LoadImm, 0)  # loops evaluate to void
+    elif isinstance(expression, Let):
+        if expression.init is None:
+            label = default_value_label(expression.type, env.strings, env.ints)
+            if label is None or expression.type in UNBOXED_TYPES:
+                value = env.define(ir.LoadImm, 0)  # void, 0 or false
+            else:
+                value = env.define(ir.LoadConst, label)
+        else:
+            value = yield expression.init
+            value = env.coerce(value, expression.init.return_type, expression.type)
+        variable = env.define(ir.Move, value)
+        env.variables.new_scope()
+        env.variables[expression.object] = variable
+        value = yield expression.body
+        env.variables.destroy_scope()
+        return env.coerce(value, expression.body.return_type, expression.return_type)
+    elif isinstance(expression, New):
+        if expression.type in UNBOXED_TYPES:
+            return env.define(ir.LoadImm, 0)
+        if expression.type == "SELF_TYPE":
+            # class_objTab has a prototype and init function pair for each tag
+            tag = env.define(ir.LoadField, env.self_temp, 0)
+            entry = env.define(ir.BinOp, "add", env.define(ir.LoadConst, "class_objTab"),
+                               env.define(ir.BinOp, "sll", tag, 3))
+            obj = env.define(ir.Call, "Object.copy", [env.define(ir.LoadField, entry, 0)])
+            return env.define(ir.Call, env.define(ir.LoadField, entry, 4), [obj])
+        obj = env.define(ir.Alloc, expression.type)
+        if not has_initializers(env.class_table, env.class_table.ids[expression.type]):
+            return obj  # the copy of the prototype is initialized already
+        return env.define(ir.Call, "%s_init" % expression.type, [obj])
+    elif isinstance(expression, Dispatch) or isinstance(expression, StaticDispatch):
+        args = []
+        for expr in expression.expr_list:
+            args.append(env.box((yield expr), expr.return_type))
+        if expression.body == "self":
+            receiver = env.self_temp
+            receiver_class = env.cl.name
+        else:
+            receiver = yield expression.body
+            receiver_class = env.static_class(expression.body.return_type)
+            if receiver_class in UNBOXED_TYPES:
+                receiver = env.box(receiver, receiver_class)  # never void
+            else:
+                env.emit(ir.CheckVoid(receiver, "_dispatch_abort"))
+        if isinstance(expression, StaticDispatch):
+            table = env.class_table
+            clid = table.ids[expression.type]
+            implementing_class = table.methods[clid][table.method_slots[clid][expression.method]][1]
+            result = env.define(ir.Call, "%s.%s" % (implementing_class, expression.method), [receiver] + args)
+        else:
+            result = env.define(ir.VirtualCall, receiver_class, expression.method, [receiver] + args)
+        return env.unbox(result, expression.return_type)
+    elif isinstance(expression, Case):
+        value = yield expression.expr
+        if expression.expr.return_type in UNBOXED_TYPES:
+            value = env.box(value, expression.expr.return_type)
+        else:
+            env.emit(ir.CheckVoid(value, "_case_abort2"))
+        tag = env.define(ir.LoadField, value, 0)
+
+        class_table = env.class_table
+        branches = [case for case in expression.case_list if case[1] in class_table.ids]  # other classes never match
+        branch_ranges = []
+        for name, typename, body in branches:
+            clid = class_table.ids[typename]
+            branch_ranges.append((clid, class_table.max_descendants[clid]))
+        branch_blocks = [env.function.new_block() for _ in branches]
+        no_match, done = env.function.new_block(), env.function.new_block()
+        targets = {i: block.label for i, block in enumerate(branch_blocks)}
+        targets[None] = no_match.label
+        lower_case_dispatch(env, tag, branch_ranges, targets)
+
+        env.start(no_match)
+        env.terminate(ir.CaseAbort(value))
+        result = env.function.new_temp()
+        for (name, typename, body), block in zip(branches, branch_blocks):
+            env.start(block)
+            env.variables.new_scope()
+            if typename in UNBOXED_TYPES:
+                env.variables[name] = env.define(ir.Unbox, value)
+            else:
+                env.variables[name] = env.define(ir.Move, value)
+            branch_value = yield body
+            env.variables.destroy_scope()
+            env.emit(ir.Move(result, env.coerce(branch_value, body.return_type, expression.return_type)))
+            env.terminate(ir.Jump(done.label))
+        env.start(done)
+        return result
+
+
+def lower_method(cl, method, class_table, strings, ints, unboxed_attributes=False):
+    function = ir.Function("%s.%s" % (cl.name, method.name), cl.name, len(method.formal_list))
+    env = Environment(cl, class_table, strings, ints, function, unboxed_attributes)
+    env.variables.new_scope()
+    env.start(function.new_block())
+    for formal, param in zip(method.formal_list, function.params[1:]):
+        # arguments are objects
+        env.variables[formal[0]] = env.unbox(param, formal[1])
+    value = lower_expression(method.body, env)
+    env.terminate(ir.Return(env.box(value, method.body.return_type)))
+    return function
+
+
+def has_initializers(class_table, clid):
+    """whether some attribute of the class, maybe inherited, is not
+    initialized with the default value of its type"""
+    return any(attr.body is not None for attr in class_table.attributes[clid])
+
+
+def lower_init(clid, class_table, strings, ints, unboxed_attributes=False):
+    """init function of a class, evaluating the initializers of all its
+    attributes, the inherited ones first, without calling the init function
+    of the parent"""
+    cl = class_table.classes[clid]
+    function = ir.Function("%s_init" % cl.name, cl.name, 0)
+    env = Environment(cl, class_table, strings, ints, function, unboxed_attributes)
+    env.start(function.new_block())
+    for feat in class_table.attributes[clid]:
+        if feat.body is not None:
+            value = lower_expression(feat.body, env)
+            value = env.coerce(value, feat.body.return_type, feat.type)
+            env.store_attribute(env.variables[feat.name], value, feat.type)
+    env.terminate(ir.Return(env.self_temp))
+    return function
+
+
+def lower_program(class_table, strings, ints, unboxed_attributes=False):
+    """intermediate representation of all the init functions and methods,
+    Int and Bool attributes hold words when unboxed_attributes is set"""
+    program = ir.Program(class_table, strings, ints)
+    program.unboxed_attributes = unboxed_attributes
+    for clid in range(len(class_table)):
+        program.functions.append(lower_init(clid, class_table, strings, ints, unboxed_attributes))
+    for cl in class_table.classes:
+        for feat in cl.feature_list:
+            if isinstance(feat, Method) and feat.inherited_from is None and feat.body is not None:
+                # base class methods without a body are implemented by the runtime
+                program.functions.append(lower_method(cl, feat, class_table, strings, ints, unboxed_attributes))
+    return program
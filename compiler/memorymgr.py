@@ -1,12 +1,65 @@
-fp_offset = 0
+"""layout of the stack frames of functions
 
+    fp + 4*n ... fp + 4   arguments, the first one is the farthest from fp
+    fp                    frame pointer of the caller
+    fp - 4                return address
+    fp - 8 ...            saved registers, $s0 first when the function uses self
+    ...                   temporaries not kept in registers, one word each
+    ... sp + 4            arguments of the calls made by the function
 
-def enter_frame():
-    global fp_offset
-    fp_offset = 0
+the prologue allocates the whole frame at once and $sp stays at its bottom
+while the function runs. Temporaries whose live intervals do not overlap
+share a slot: the variables of sibling scopes, the branches of a case and
+the many short lived values of an expression all reuse the same few slots.
+"""
+import heapq
 
+FRAME_HEADER_SIZE = 8  # old frame pointer and return address
 
-def codestack_push(bytes):
-    global fp_offset
-    fp_offset -= bytes
-    return "addi $sp, $sp, -" + str(bytes)
+
+def frame_size(saved_count, slot_count, outgoing_count):
+    """bytes of a frame saving saved_count registers, with slot_count
+    temporaries, making calls with up to outgoing_count arguments"""
+    return FRAME_HEADER_SIZE + 4 * (saved_count + slot_count + outgoing_count)
+
+
+def saved_register_operand(i):
+    return "%d($fp)" % -(FRAME_HEADER_SIZE + 4 * i)
+
+
+def slot_operand(slot, saved_count):
+    return "%d($fp)" % -(FRAME_HEADER_SIZE + 4 * (saved_count + slot))
+
+
+def argument_operand(i, argument_count):
+    """where argument i of the running function is"""
+    return "%d($fp)" % (4 * (argument_count - i))
+
+
+def outgoing_operand(i, argument_count):
+    """where argument i of a call goes, right above $sp so that the callee
+    finds it above its frame pointer"""
+    return "%d($sp)" % (4 * (argument_count - i))
+
+
+def assign_slots(intervals):
+    """pack the live intervals of temporaries in as few slots as possible
+
+    intervals maps every temporary to its (first, last) position, a
+    temporary can take the slot of one whose last use is where it is
+    defined. Returns the slot of each temporary and the number of slots."""
+    slots = {}
+    slot_count = 0
+    free = []
+    active = []  # (last position, slot) of the temporaries holding a slot
+    for temp, (start, end) in sorted(intervals.items(), key=lambda item: item[1]):
+        while active and active[0][0] <= start:
+            heapq.heappush(free, heapq.heappop(active)[1])
+        if free:
+            slot = heapq.heappop(free)
+        else:
+            slot = slot_count
+            slot_count += 1
+        slots[temp] = slot
+        heapq.heappush(active, (end, slot))
+    return slots, slot_count
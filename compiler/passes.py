@@ -0,0 +1,56 @@
+"""pass manager running transformations on the intermediate representation
+
+every pass takes a Program and changes it in place. Passes run in the order
+of `pipeline`, the time each one takes can be collected and the program can
+be dumped after each of them.
+"""
+import time
+from . import ir
+from .reachability import remove_dead_code
+from .devirtualize import devirtualize
+from .inline import inline
+from .unbox import remove_boxing, box_words_across_allocations
+from .loops import reduce_strength, hoist_loop_invariants
+from .tailcall import mark_tail_calls
+
+
+def for_each_function(transform):
+    """pass applying transform to every function of the program"""
+    def run(program):
+        for function in program.functions:
+            transform(function)
+    return run
+
+
+pipeline = [
+    ("remove-unreachable-blocks", for_each_function(ir.remove_unreachable_blocks)),
+    ("remove-dead-code", remove_dead_code),
+    ("devirtualize", devirtualize),
+    ("inline", inline),
+    ("remove-boxing", remove_boxing),
+    ("reduce-strength", reduce_strength),
+    ("hoist-loop-invariants", hoist_loop_invariants),
+    # functions inlined at all their call sites are no longer reachable
+    ("remove-dead-code", remove_dead_code),
+    ("mark-tail-calls", mark_tail_calls),
+    # only with a collector, once no pass moves instructions any more
+    ("box-words-across-allocations", box_words_across_allocations),
+]
+
+
+def run_passes(program, dump=None, timings=None):
+    """run the pipeline on program
+
+    the program is written to the file-like dump after lowering and after
+    every pass; timings, a dict, collects the seconds spent in every pass"""
+    if dump is not None:
+        dump.write("*** after lowering\n")
+        dump.write(ir.format_program(program))
+    for name, transform in pipeline:
+        start = time.perf_counter()
+        transform(program)
+        if timings is not None:
+            timings[name] = timings.get(name, 0) + time.perf_counter() - start
+        if dump is not None:
+            dump.write("*** after %s\n" % name)
+            dump.write(ir.format_program(program))
@@ -0,0 +1,151 @@
+"""peephole optimization of the emitted assembly
+
+codegen writes the code of a function as text, one instruction per line,
+the text is parsed back into a list of Label and Instruction and every
+pattern of the library is tried on each pair of consecutive instructions
+until none applies. Labels end the window: code may jump between two
+instructions separated by a label, so nothing is known about the state of
+the machine there, and the labels of blocks that are only entered by
+falling through are removed first.
+"""
+from collections import namedtuple
+
+Label = namedtuple("Label", "name")
+Instruction = namedtuple("Instruction", "op, operands, comment")
+
+
+def instruction(op, *operands):
+    return Instruction(op, list(operands), None)
+
+
+def parse(text):
+    """list of Label and Instruction of the lines written by codegen, which
+    separates operands with a comma and a space"""
+    items = []
+    for text_line in text.splitlines():
+        if text_line[0] != "\t":
+            items.append(Label(text_line[:-1]))
+            continue
+        comment = None
+        if "#" in text_line:
+            text_line, _, comment = text_line.partition("#")
+            text_line, comment = text_line.rstrip(), comment.strip()
+        op, _, operands = text_line[1:].partition(" ")
+        items.append(Instruction(op, operands.split(", ") if operands else [], comment))
+    return items
+
+
+def format_items(items):
+    text = []
+    for item in items:
+        if isinstance(item, Label):
+            text.append("%s:\n" % item.name)
+        else:
+            code = "%s %s" % (item.op, ", ".join(item.operands)) if item.operands else item.op
+            if item.comment is not None:
+                code = "%s # %s" % (code, item.comment)
+            text.append("\t%s\n" % code)
+    return "".join(text)
+
+
+def base_register(operand):
+    """register an offset(register) operand refers to"""
+    return operand[operand.index("(") + 1:-1] if "(" in operand else None
+
+
+# every pattern takes two consecutive instructions and returns the
+# instructions replacing them, or None when it does not apply
+
+def store_then_load(first, second):
+    """the value just stored is still in the register"""
+    if first.op == "sw" and second.op == "lw" and first.operands[1] == second.operands[1]:
+        if first.operands[0] == second.operands[0]:
+            return [first]
+        return [first, instruction("move", second.operands[0], first.operands[0])]
+
+
+def load_then_store(first, second):
+    """storing back the value just loaded"""
+    if first.op == "lw" and second.op == "sw" and first.operands == second.operands \
+            and base_register(first.operands[1]) != first.operands[0]:
+        return [first]
+
+
+def overwritten_store(first, second):
+    """a store to the same place right after it"""
+    if first.op == "sw" and second.op == "sw" and first.operands[1] == second.operands[1]:
+        return [second]
+
+
+def stack_adjustments(first, second):
+    """consecutive changes of the stack pointer"""
+    if first.op in ("addi", "addiu") and second.op in ("addi", "addiu") \
+            and first.operands[0] == "$sp" and second.operands[0] == "$sp":
+        if second.operands[1] == "$sp":
+            offset = int(first.operands[2]) + int(second.operands[2])
+            if first.operands[1] == "$sp" and offset == 0:
+                return []
+            return [instruction("addiu", "$sp", first.operands[1], str(offset))]
+        return [second]  # the first value of $sp is never used
+
+
+def useless_move(first, second):
+    """a move to the register it comes from, or back to where it was
+    moved from"""
+    if first.op == "move" and first.operands[0] == first.operands[1]:
+        return [second]
+    if second.op == "move" and second.operands[0] == second.operands[1]:
+        return [first]
+    if first.op == "move" and second.op == "move" and first.operands == second.operands[::-1]:
+        return [first]
+
+
+def useless_stack_adjustment(first, second):
+    """adding 0 to the stack pointer"""
+    for item in (first, second):
+        if item.op in ("addi", "addiu") and item.operands == ["$sp", "$sp", "0"]:
+            return [second] if item is first else [first]
+
+
+patterns = [
+    ("store-then-load", store_then_load),
+    ("load-then-store", load_then_store),
+    ("overwritten-store", overwritten_store),
+    ("stack-adjustments", stack_adjustments),
+    ("useless-move", useless_move),
+    ("useless-stack-adjustment", useless_stack_adjustment),
+]
+
+
+def remove_unused_labels(items):
+    """drop the labels no instruction refers to, except the first one which
+    is the name of the function"""
+    referenced = {operand for item in items if isinstance(item, Instruction) for operand in item.operands}
+    return items[:1] + [item for item in items[1:] if not isinstance(item, Label) or item.name in referenced]
+
+
+def optimize(items, statistics=None):
+    """apply the patterns to items until none applies, the number of
+    instructions removed is added to statistics"""
+    # fewer labels give longer windows
+    pending = remove_unused_labels(items)[::-1]
+    optimized = []
+    while pending:
+        item = pending.pop()
+        if optimized and isinstance(optimized[-1], Instruction) and isinstance(item, Instruction):
+            first = optimized[-1]
+            for name, pattern in patterns:
+                replacement = pattern(first, item)
+                if replacement is not None and replacement != [first, item]:
+                    # the new instructions may combine with the ones before
+                    optimized.pop()
+                    pending.extend(reversed(replacement))
+                    if statistics is not None:
+                        statistics["peephole removed instructions"] = \
+                            statistics.get("peephole removed instructions", 0) + 2 - len(replacement)
+                    break
+            else:
+                optimized.append(item)
+            continue
+        optimized.append(item)
+    return optimized
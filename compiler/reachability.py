@@ -0,0 +1,80 @@
+"""whole program reachability
+
+starting from the functions the runtime calls, follows the calls of every
+reachable function. The possible targets of a dispatch are found with the
+class hierarchy: the implementations of the method in the static type of the
+receiver and in its subclasses, keeping only the classes that are ever
+instantiated. Functions never reached are removed from the program, and
+codegen leaves out the tables and constants of classes never instantiated.
+"""
+from . import ir
+
+# called and instantiated by the runtime
+RUNTIME_ENTRY_POINTS = ["Main_init", "Main.main", "Int_init", "String_init", "Bool_init"]
+RUNTIME_CLASSES = ["Main", "Int", "String", "Bool"]
+
+
+def dispatch_targets(table, typename, method, is_instantiated):
+    """labels of the methods a dispatch on a receiver of static type
+    typename may run, is_instantiated tells which classes have objects"""
+    clid = table.ids[typename]
+    slot = table.method_slots[clid][method]
+    targets = set()
+    for subclid in range(clid, table.max_descendants[clid] + 1):
+        if is_instantiated(table.names[subclid]):
+            targets.add("%s.%s" % (table.methods[subclid][slot][1], method))
+    return targets
+
+
+def find_reachable(program):
+    """names of the reachable functions and of the instantiated classes"""
+    table = program.class_table
+    functions = {function.name: function for function in program.functions}
+    reachable = set()
+    instantiated = set(RUNTIME_CLASSES)
+    virtual_calls = set()  # (static type, method name)
+    # whether some function does new SELF_TYPE, calling the init function
+    # found in class_objTab
+    self_type_new = False
+    to_visit = []
+
+    def mark(name):
+        # methods implemented by the runtime are not in functions
+        if name in functions and name not in reachable:
+            reachable.add(name)
+            to_visit.append(functions[name])
+
+    for name in RUNTIME_ENTRY_POINTS:
+        mark(name)
+    while to_visit:
+        while to_visit:
+            function = to_visit.pop()
+            for block in function.blocks:
+                for instruction in block.instructions:
+                    if isinstance(instruction, ir.Call):
+                        if isinstance(instruction.target, ir.Temp):
+                            self_type_new = True
+                        else:
+                            mark(instruction.target)
+                    elif isinstance(instruction, ir.VirtualCall):
+                        virtual_calls.add((instruction.type, instruction.method))
+                    elif isinstance(instruction, ir.Alloc):
+                        instantiated.add(instruction.type)
+
+        # new classes may have been instantiated since the last resolution
+        for typename, method in virtual_calls:
+            for target in dispatch_targets(table, typename, method, instantiated.__contains__):
+                mark(target)
+        if self_type_new:
+            # once inlined, new SELF_TYPE is in functions of other classes,
+            # the object copied may be of any class instantiated
+            for classname in instantiated:
+                mark("%s_init" % classname)
+    return reachable, instantiated
+
+
+def remove_dead_code(program):
+    """drop the functions that can never run"""
+    reachable, instantiated = find_reachable(program)
+    program.functions[:] = [f for f in program.functions if f.name in reachable]
+    program.instantiated = instantiated
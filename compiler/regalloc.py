@@ -0,0 +1,76 @@
+"""linear scan register allocation
+
+temporaries get registers in the order their live intervals start; when
+none is free, the temporary whose interval ends last is spilled to a frame
+slot. The runtime routines and the methods called clobber the caller saved
+registers, so a temporary live across a call can only take a callee saved
+one, which the function saves in its frame when it uses it. $t0 to $t2 are
+the scratch registers of codegen, $s0 holds self and $s7 the heap limit of
+the runtime.
+"""
+import bisect
+from . import ir
+
+CALLER_SAVED = ["$t3", "$t4", "$t5", "$t6", "$t7", "$t8", "$t9"]
+CALLEE_SAVED = ["$s1", "$s2", "$s3", "$s4", "$s5", "$s6"]
+
+
+def calls_routine(instruction, program):
+    """whether the code of instruction may jump to a routine that returns"""
+    if isinstance(instruction, (ir.Call, ir.VirtualCall, ir.Alloc, ir.Equal)):
+        return True
+    elif isinstance(instruction, ir.Box):
+        return instruction.type == "Int"
+    elif isinstance(instruction, ir.StoreField):
+        return program.gc == "GEN_GC" and not instruction.word  # write barrier
+    return False
+
+
+def live_across_calls(function, intervals, program):
+    """the temporaries whose value must survive a call"""
+    crossing = set()
+    call_positions = []
+    position = 0
+    for block in function.blocks:
+        for instruction in block.instructions:
+            if calls_routine(instruction, program):
+                call_positions.append(position)
+                if isinstance(instruction, ir.Box) and program.gc == "NO_GC":
+                    crossing.add(instruction.src)  # stored in the new object
+            position += 1
+    for temp, (start, end) in intervals.items():
+        i = bisect.bisect_right(call_positions, start)
+        if i < len(call_positions) and call_positions[i] < end:
+            crossing.add(temp)
+    return crossing
+
+
+def linear_scan(intervals, crossing):
+    """registers of the temporaries, and the intervals of the ones spilled
+
+    intervals maps temporaries to their (first, last) position, crossing
+    holds the ones that must be in a callee saved register"""
+    registers = {}
+    spilled = {}
+    free = {register: True for register in CALLER_SAVED + CALLEE_SAVED}
+    active = []  # temporaries holding a register
+    for temp, (start, end) in sorted(intervals.items(), key=lambda item: item[1]):
+        for other in [a for a in active if intervals[a][1] <= start]:
+            active.remove(other)
+            free[registers[other]] = True
+        allowed = CALLEE_SAVED if temp in crossing else CALLER_SAVED + CALLEE_SAVED
+        register = next((r for r in allowed if free[r]), None)
+        if register is None:
+            # spill the interval ending last
+            candidates = [a for a in active if registers[a] in allowed]
+            victim = max(candidates, key=lambda a: intervals[a][1], default=None)
+            if victim is None or intervals[victim][1] <= end:
+                spilled[temp] = (start, end)
+                continue
+            register = registers.pop(victim)
+            active.remove(victim)
+            spilled[victim] = intervals[victim]
+        free[register] = False
+        registers[temp] = register
+        active.append(temp)
+    return registers, spilled
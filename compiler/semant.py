@@ -2,24 +2,59 @@ from .parser import Class, Method, Attr, Object, Int, Str, Block, Assign, \
         Dispatch, StaticDispatch, Plus, Sub, Mult, Div, Lt, Le, Eq, \
         If, While, Let, Case, New, Isvoid, Neg, Not, Bool
 
-from collections import defaultdict, MutableMapping, Set
+from .traversal import walk, copy_tree
+from .classtable import ClassTable
+
+from collections import defaultdict, ChainMap
+from collections.abc import MutableMapping, Set
+import functools
 import warnings
-from copy import deepcopy
 
 class SemantError(Exception):
     pass
 
 
+class SemantErrors(SemantError):
+    """all the errors found when semant runs collecting diagnostics"""
+
+    def __init__(self, errors):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
 class SemantWarning(Warning):
     pass
 
 
+# type given to expressions that failed to check: it conforms to anything, so
+# a single mistake does not trigger more errors in the enclosing expressions
+ERROR_TYPE = "_no_type"
+
+# list of error messages while collecting diagnostics, None to stop at the
+# first error
+diagnostics = None
+
+
+def report(*messages):
+    """raise a semantic error, or record it when collecting diagnostics"""
+    if diagnostics is None:
+        raise SemantError("\n".join(messages))
+    diagnostics.extend(messages)
+
+
+def has_type(expression, typename):
+    return expression.return_type in (typename, ERROR_TYPE)
+
+
 #classes_dict = {}
 #inheritance_graph = defaultdict(set)  # format {'classname': {'childclass1', 'childclass2'}}
 
+# id based view of the classes, available once inheritance has been applied
+class_table = None
 
-def install_base_classes(ast):
-    """purpose of this is to add base classes always available in the language"""
+
+def base_classes():
+    """new instances of the base classes always available in the language"""
     objc = Class("Object", None, [
         Method('abort', [], 'Object', None),  # aborts the program
         Method('type_name', [], 'String', None),  # returns string repr of classname
@@ -44,16 +79,43 @@ def install_base_classes(ast):
         Method('concat', [('arg', 'String')], 'String', None),  # str concatenation
         Method('substr', [('arg1', 'Int'), ('arg2', 'Int')], 'String', None),  # str subselection
     ])
-    ast += [objc, ioc, intc, boolc, stringc]
+    return [objc, ioc, intc, boolc, stringc]
 
 
-def build_inheritance_graph(ast):
-    global classes_dict, inheritance_graph
+def install_base_classes(ast):
+    """purpose of this is to add base classes always available in the language"""
+    ast += base_classes()
+
+
+@functools.lru_cache(maxsize=None)
+def prelude():
+    """base classes with inheritance applied and types checked, built once
+    per process and shared (never modified) by all the programs compiled"""
+    build_inheritance_graph(base_classes())
+    expand_inherited_classes()
+    for cl in classes_dict.values():
+        check_scopes_and_infer_return_types(cl)
+    for cl in classes_dict.values():
+        type_check(cl)
+    return classes_dict, inheritance_graph
+
+
+def build_inheritance_graph(ast, base_classes_dict=None, base_graph=None):
+    """index the classes in ast by name and build the graph of their
+    children, optionally layered on top of already checked base classes"""
+    global classes_dict, inheritance_graph, class_table
+    class_table = None
     classes_dict = {}
     inheritance_graph = defaultdict(set)  # format {'classname': {'childclass1', 'childclass2'}}
+    if base_classes_dict is not None:
+        # base classes are looked up through the chain, not copied
+        classes_dict = ChainMap(classes_dict, base_classes_dict)
+        for clname, children in base_graph.items():
+            inheritance_graph[clname] = set(children)
     for cl in ast:
         if cl.name in classes_dict:
-            raise SemantError("class %s already defined" % cl.name)
+            report("class %s already defined" % cl.name)
+            continue
         classes_dict[cl.name] = cl
         if cl.name == "Object":
             continue  # Object has no parent
@@ -72,31 +134,63 @@ def check_for_undefined_classes():
 def impede_inheritance_from_base_classes():
     for parent in ['String', 'Int', 'Bool']:
         for cl_name in inheritance_graph[parent]:
-            raise SemantError("Class %s cannot inherit from base class %s" % (cl_name, parent))
-
-
-def visit_inheritance_tree(start_class, visited):
-    visited[start_class] = True
-
-    if start_class not in inheritance_graph.keys():
-        return True
-
-    for childc in inheritance_graph[start_class]:
-        #print("%s to %s" % (start_class, childc))
-        visit_inheritance_tree(childc, visited)
+            report("Class %s cannot inherit from base class %s" % (cl_name, parent))
+
+
+def find_inheritance_cycles():
+    """return the classes of every inheritance cycle, found as the strongly
+    connected components of the inheritance graph (Tarjan's algorithm)"""
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    component_stack = []
+    cycles = []
+
+    def children(clname):
+        return iter(inheritance_graph.get(clname, ()))
+
+    def discover(clname):
+        index[clname] = lowlink[clname] = len(index)
+        component_stack.append(clname)
+        on_stack.add(clname)
+
+    for root in list(inheritance_graph.keys()):
+        if root in index:
+            continue
+        discover(root)
+        to_visit = [(root, children(root))]
+        while to_visit:
+            clname, pending_children = to_visit[-1]
+            for childc in pending_children:
+                if childc not in index:
+                    discover(childc)
+                    to_visit.append((childc, children(childc)))
+                    break
+                elif childc in on_stack:
+                    lowlink[clname] = min(lowlink[clname], index[childc])
+            else:
+                # all children visited, propagate the lowlink to the parent
+                to_visit.pop()
+                if to_visit:
+                    parentc = to_visit[-1][0]
+                    lowlink[parentc] = min(lowlink[parentc], lowlink[clname])
+                if lowlink[clname] == index[clname]:
+                    component = []
+                    while True:
+                        member = component_stack.pop()
+                        on_stack.remove(member)
+                        component.append(member)
+                        if member == clname:
+                            break
+                    if len(component) > 1 or clname in inheritance_graph.get(clname, ()):
+                        cycles.append(sorted(component))
+    return sorted(cycles)
 
-    return True
 
 def check_for_inheritance_cycles():
-    visited = {}
-    for parent_name in inheritance_graph.keys():
-        visited[parent_name] = False
-        for cl_name in inheritance_graph[parent_name]:
-            visited[cl_name] = False
-    visit_inheritance_tree("Object", visited)
-    for k,v in visited.items():
-        if not v:
-            raise SemantError("%s involved in an inheritance cycle." % k)
+    cycles = find_inheritance_cycles()
+    if cycles:
+        report(*["%s involved in an inheritance cycle." % ", ".join(cycle) for cycle in cycles])
 
 
 class VariablesScopeDict(MutableMapping):
@@ -171,7 +265,8 @@ def check_scopes_and_infer_return_types(cl):
         # first add all attributes to the scope
         if isinstance(feature, Attr):
             if feature.name in attr_seen:
-                raise SemantError("attribute %s is already defined" % feature.name)
+                report("attribute %s is already defined" % feature.name)
+                continue
             attr_seen.add(feature.name)
 
             if feature.type == "SELF_TYPE":
@@ -185,14 +280,14 @@ def check_scopes_and_infer_return_types(cl):
             traverse_expression(feature.body, variable_scopes, cl)
         elif isinstance(feature, Method):
             if feature.name in method_seen:
-                raise SemantError("method %s is already defined" % feature.name)
+                report("method %s is already defined" % feature.name)
             method_seen.add(feature.name)
             variable_scopes.new_scope()
 
             formals_seen = set()
             for formal in feature.formal_list:
                 if formal in formals_seen:
-                    raise SemantError("formal %s in method %s is already defined" % (formal[0], feature.name))
+                    report("formal %s in method %s is already defined" % (formal[0], feature.name))
                 formals_seen.add(formal)
                 variable_scopes[formal[0]] = formal[1]
 
@@ -202,10 +297,15 @@ def check_scopes_and_infer_return_types(cl):
 
 def lowest_common_ancestor(*classes):
     """return the lowest common parent of cl1 and cl2"""
+    if class_table is not None:
+        ids = [class_table.ids[cl.name] for cl in classes]
+        return class_table.names[functools.reduce(class_table.common_ancestor, ids)]
+
     def ascend_tree(cl):
         yield cl.name
-        if cl.parent:
-            yield from ascend_tree(classes_dict[cl.parent])
+        while cl.parent:
+            cl = classes_dict[cl.parent]
+            yield cl.name
 
     inheritance_paths = []
     for cl in classes:
@@ -225,48 +325,66 @@ def lowest_common_ancestor(*classes):
 
 
 def traverse_expression(expression, variable_scopes, cl):
+    walk(_traverse_expression, expression, variable_scopes, cl)
+
+
+def joined_type(*typenames):
+    """name of the lowest common parent of the branches of an if or a case,
+    ERROR_TYPE if one of them failed to check or is of an undefined class"""
+    if ERROR_TYPE in typenames:
+        return ERROR_TYPE
+    undefined = [x for x in dict.fromkeys(typenames) if x not in classes_dict]
+    for typename in undefined:
+        report("branch of the undefined class %s" % typename)
+    if undefined:
+        return ERROR_TYPE
+    return lowest_common_ancestor(*[classes_dict[x] for x in typenames])
+
+
+def _traverse_expression(expression, variable_scopes, cl):
+    # generator visitor driven by walk, every yield traverses a sub-expression
     if isinstance(expression, Isvoid):
-        traverse_expression(expression.body, variable_scopes, cl)
+        yield expression.body
         expression.return_type = "Bool"
     elif any(isinstance(expression, X) for X in [Eq, Lt, Le]):
-        traverse_expression(expression.first, variable_scopes, cl)
-        traverse_expression(expression.second, variable_scopes, cl)
+        yield expression.first
+        yield expression.second
         expression.return_type = "Bool"
     elif isinstance(expression, Neg):
-        traverse_expression(expression.body, variable_scopes, cl)
+        yield expression.body
         expression.return_type = "Int"
     elif isinstance(expression, Not):
-        traverse_expression(expression.body, variable_scopes, cl)
+        yield expression.body
         expression.return_type = "Bool"
     elif any(isinstance(expression, X) for X in [Plus, Sub, Mult, Div]):
-        traverse_expression(expression.first, variable_scopes, cl)
-        traverse_expression(expression.second, variable_scopes, cl)
+        yield expression.first
+        yield expression.second
         expression.return_type = "Int"
     elif isinstance(expression, While):
-        traverse_expression(expression.predicate, variable_scopes, cl)
-        traverse_expression(expression.body, variable_scopes, cl)
+        yield expression.predicate
+        yield expression.body
     elif isinstance(expression, Let):
         # LET creates a new scope
         variable_scopes.new_scope()
         variable_scopes[expression.object] = expression.type
-        traverse_expression(expression.init, variable_scopes, cl)
-        traverse_expression(expression.body, variable_scopes, cl)
+        yield expression.init
+        yield expression.body
         variable_scopes.destroy_scope()
         expression.return_type = expression.body.return_type
     elif isinstance(expression, Block):
         last_type = None
         for expr in expression.body:
-            traverse_expression(expr, variable_scopes, cl)
+            yield expr
             last_type = getattr(expr, 'return_type', None)
         expression.return_type = last_type
     elif isinstance(expression, Assign):
-        traverse_expression(expression.body, variable_scopes, cl)
-        traverse_expression(expression.name, variable_scopes, cl)
+        yield expression.body
+        yield expression.name
         expression.return_type = expression.name.return_type  # type comes from var declaration
     elif isinstance(expression, Dispatch) or isinstance(expression, StaticDispatch):
-        traverse_expression(expression.body, variable_scopes, cl)
+        yield expression.body
         for expr in expression.expr_list:
-            traverse_expression(expr, variable_scopes, cl)
+            yield expr
 
         # REDUNDANT code, copied from type_check because we need to infer
         # the dispatch return type from the called method type
@@ -276,6 +394,9 @@ def traverse_expression(expression, variable_scopes, cl):
             bodycln = cl.name
         else:
             bodycln = expression.body.return_type
+        if bodycln == ERROR_TYPE:
+            expression.return_type = ERROR_TYPE
+            return
 
         called_method = None
         if bodycln in classes_dict:
@@ -284,7 +405,9 @@ def traverse_expression(expression, variable_scopes, cl):
                 if isinstance(feature, Method) and feature.name == expression.method:
                     called_method = feature
         if not called_method:
-            raise SemantError("Tried to call the undefined method %s in class %s" % (expression.method, bodycl.name))
+            report("Tried to call the undefined method %s in class %s" % (expression.method, bodycln))
+            expression.return_type = ERROR_TYPE
+            return
 
         if called_method.return_type == "SELF_TYPE":
             method_type = bodycl.name
@@ -293,33 +416,37 @@ def traverse_expression(expression, variable_scopes, cl):
 
         expression.return_type = method_type
     elif isinstance(expression, If):
-        traverse_expression(expression.predicate, variable_scopes, cl)
-        traverse_expression(expression.then_body, variable_scopes, cl)
-        traverse_expression(expression.else_body, variable_scopes, cl)
-        then_type = classes_dict[expression.then_body.return_type]
-        else_type = classes_dict[expression.else_body.return_type]
-        ret_type = lowest_common_ancestor(then_type, else_type)
-        expression.return_type = ret_type
+        yield expression.predicate
+        yield expression.then_body
+        yield expression.else_body
+        expression.return_type = joined_type(expression.then_body.return_type, expression.else_body.return_type)
     elif isinstance(expression, Case):
-        traverse_expression(expression.expr, variable_scopes, cl)
+        yield expression.expr
         branch_types = []
         for case in expression.case_list:
             variable_scopes.new_scope()  # every branch of case has its own scope
             variable_scopes[case[0]] = case[1]
-            traverse_expression(case[2], variable_scopes, cl)
-            branch_types.append(classes_dict[case[2].return_type])
-        expression.return_type = lowest_common_ancestor(*branch_types)
+            yield case[2]
+            variable_scopes.destroy_scope()
+            branch_types.append(case[2].return_type)
+        expression.return_type = joined_type(*branch_types)
     elif isinstance(expression, Object):
         if expression.name == "self":
             expression.return_type = cl.name
             return
         if expression.name not in variable_scopes:
-            raise SemantError("variable %s not in scope" % expression.name)
+            report("variable %s not in scope" % expression.name)
+            expression.return_type = ERROR_TYPE
+            return
         expression.return_type = variable_scopes[expression.name]
     elif isinstance(expression, New):
         if expression.type == "SELF_TYPE":
             expression.return_type = cl.name
             return
+        if expression.type not in classes_dict:
+            report("new of the undefined class %s" % expression.type)
+            expression.return_type = ERROR_TYPE
+            return
         expression.return_type = expression.type
     elif isinstance(expression, Int):
         expression.return_type = "Int"
@@ -331,7 +458,17 @@ def traverse_expression(expression, variable_scopes, cl):
 
 def expand_inherited_classes(start_class="Object"):
     """apply inheritance rules through the class graph"""
-    cl = classes_dict[start_class]
+    # parents are always expanded before their children, so each class only
+    # needs to copy what its direct parent has
+    to_expand = [start_class]
+    while to_expand:
+        clname = to_expand.pop()
+        expand_inherited_class(classes_dict[clname])
+        to_expand.extend(inheritance_graph[clname])
+
+
+def expand_inherited_class(cl):
+    """copy attributes and methods of the parent class into cl"""
     if cl.parent:
         parentcl = classes_dict[cl.parent]
 
@@ -339,10 +476,12 @@ def expand_inherited_classes(start_class="Object"):
         attr_set_in_child = [i for i in cl.feature_list if isinstance(i, Attr)]
         attr_set_in_parent = [i for i in parentcl.feature_list if isinstance(i, Attr)]
 
+        redefined_attrs = set()
         for attr in attr_set_in_child:
             for pattr in attr_set_in_parent:
                 if attr.name == pattr.name:
-                    raise SemantError("Attribute cannot be redefined in child class %s" % cl.name)
+                    report("Attribute cannot be redefined in child class %s" % cl.name)
+                    redefined_attrs.add(attr.name)
 
         method_set_in_child = [i for i in cl.feature_list if isinstance(i, Method)]
         method_set_in_parent = [i for i in parentcl.feature_list if isinstance(i, Method)]
@@ -366,7 +505,7 @@ def expand_inherited_classes(start_class="Object"):
                 parent_signature = method_signatures_for_parent[method.name]
                 child_signature = method_signatures_for_child[method.name]
                 if parent_signature != child_signature:
-                    raise SemantError("Redefined method %s cannot change arguments or return type of the parent method" % method.name)
+                    report("Redefined method %s cannot change arguments or return type of the parent method" % method.name)
 
         # finished checks, now apply inheritance by simply copying definitions
         # DEEPCOPY of sub-asts to avoid interference with type inference and
@@ -375,25 +514,26 @@ def expand_inherited_classes(start_class="Object"):
         # insert instead of append so they are evaluated earlier
         for method in method_set_in_parent:
             if method.name not in methods_in_child:
-                new_method = deepcopy(method)
+                new_method = copy_tree(method)
                 new_method.inherited_from = cl.parent  # used in codegen, to reuse function bodies
                 cl.feature_list.insert(0, new_method)
         for attr in attr_set_in_parent:
-            cl.feature_list.insert(0, deepcopy(attr))
-
-    # descend down the inheritance tree, applying the same function
-    all_children = inheritance_graph[start_class]
-    for child in all_children:
-        expand_inherited_classes(child)
+            if attr.name not in redefined_attrs:
+                cl.feature_list.insert(0, copy_tree(attr))
 
 
 def is_conformant(childclname, parentclname):
     """check whether childcl is a descendent of parentcl"""
-    if childclname == parentclname:
+    if ERROR_TYPE in (childclname, parentclname):
         return True
-    for clname in inheritance_graph[parentclname]:
-        if is_conformant(childclname, clname):
+    if class_table is not None and childclname in class_table.ids and parentclname in class_table.ids:
+        return class_table.conforms(class_table.ids[childclname], class_table.ids[parentclname])
+    to_visit = [parentclname]
+    while to_visit:
+        clname = to_visit.pop()
+        if childclname == clname:
             return True
+        to_visit.extend(inheritance_graph[clname])
     return False
 
 
@@ -411,13 +551,13 @@ def type_check(cl):
                 childcln = feature.body.return_type
                 parentcln = realtype
                 if not is_conformant(childcln, parentcln):
-                    raise SemantError("Inferred type %s for attribute %s does not conform to declared type %s" % (childcln, feature.name, parentcln))
+                    report("Inferred type %s for attribute %s does not conform to declared type %s" % (childcln, feature.name, parentcln))
         elif isinstance(feature, Method):
             for formal in feature.formal_list:
                 if formal[1] == "SELF_TYPE":
-                    raise SemantError("formal %s cannot have type SELF_TYPE" % formal[0])
+                    report("formal %s cannot have type SELF_TYPE" % formal[0])
                 elif formal[1] not in classes_dict:
-                    raise SemantError("formal %s has a undefined type" % formal[0])
+                    report("formal %s has a undefined type" % formal[0])
 
             if feature.return_type == "SELF_TYPE":
                 realrettype = cl.name
@@ -440,36 +580,46 @@ def type_check(cl):
                 warnings.warn("untyped content for method %s with declared type %s" % (feature.name, declaredcln), SemantWarning)
             else:
                 if not is_conformant(returnedcln, declaredcln):
-                    raise SemantError("Inferred type %s for method %s does not conform to declared type %s" % (returnedcln, feature.name, declaredcln))
+                    report("Inferred type %s for method %s does not conform to declared type %s" % (returnedcln, feature.name, declaredcln))
 
 
 
 def type_check_expression(expression, cl):
     """make sure types validate at any point in the ast"""
+    walk(_type_check_expression, expression, cl)
+
+
+def _type_check_expression(expression, cl):
+    # generator visitor driven by walk, every yield checks a sub-expression
     if isinstance(expression, Case):
-        type_check_expression(expression.expr, cl)
+        yield expression.expr
         for case in expression.case_list:
-            type_check_expression(case[2], cl)
+            yield case[2]
     elif isinstance(expression, Assign):
-        type_check_expression(expression.body, cl)
+        yield expression.body
         if not is_conformant(expression.body.return_type, expression.name.return_type):
-            raise SemantError("The inferred type %s for %s is not conformant to declared type %s" % (expression.body.return_type, expression.name.name, expression.name.return_type))
+            report("The inferred type %s for %s is not conformant to declared type %s" % (expression.body.return_type, expression.name.name, expression.name.return_type))
     elif isinstance(expression, If):
-        type_check_expression(expression.predicate, cl)
-        type_check_expression(expression.then_body, cl)
-        type_check_expression(expression.else_body, cl)
-        if expression.predicate.return_type != "Bool":
-            raise SemantError("If statements must have boolean conditions")
+        yield expression.predicate
+        yield expression.then_body
+        yield expression.else_body
+        if not has_type(expression.predicate, "Bool"):
+            report("If statements must have boolean conditions")
     elif isinstance(expression, Let):
-        type_check_expression(expression.init, cl)
+        yield expression.init
         if expression.init:  # some let expression auto-initialize with default values
             if not is_conformant(expression.init.return_type, expression.type):
-                raise SemantError("The inferred type %s for let init is not conformant to declared type %s" % (expression.init.return_type, expression.type))
+                report("The inferred type %s for let init is not conformant to declared type %s" % (expression.init.return_type, expression.type))
+        yield expression.body
     elif isinstance(expression, Block):
         for line in expression.body:
-            type_check_expression(line, cl)
+            yield line
     elif isinstance(expression, Dispatch) or isinstance(expression, StaticDispatch):
-        type_check_expression(expression.body, cl)
+        yield expression.body
+        for expr in expression.expr_list:
+            yield expr
+        if expression.return_type == ERROR_TYPE:
+            return  # already reported while inferring types
         # dispatch to current instance (self)
         if expression.body == "self":
             bodycln = cl.name
@@ -478,7 +628,7 @@ def type_check_expression(expression, cl):
         if isinstance(expression, StaticDispatch):
             # additional check on static dispatch
             if not is_conformant(bodycln, expression.type):
-                raise SemantError("Static dispatch expression (before @Type) does not conform to declared type {}".format(expression.type))
+                report("Static dispatch expression (before @Type) does not conform to declared type {}".format(expression.type))
 
         called_method = None
         if bodycln in classes_dict:
@@ -487,63 +637,85 @@ def type_check_expression(expression, cl):
                 if isinstance(feature, Method) and feature.name == expression.method:
                     called_method = feature
         if not called_method:
-            raise SemantError("Tried to call the undefined method %s in class %s" % (expression.method, bodycl.name))
-        if len(expression.expr_list) != len(called_method.formal_list):
-            raise SemantError("Tried to call method {} in class {} with wrong number of arguments".format(called_method.name, bodycl.name))
+            report("Tried to call the undefined method %s in class %s" % (expression.method, bodycln))
+        elif len(expression.expr_list) != len(called_method.formal_list):
+            report("Tried to call method {} in class {} with wrong number of arguments".format(called_method.name, bodycl.name))
         else:
             # check conformance of arguments
             for expr, formal in zip(expression.expr_list, called_method.formal_list):
                 if not is_conformant(expr.return_type, formal[1]):
-                    raise SemantError("Argument {} passed to method {} in class {} is not conformant to its {} declaration".format(expr.return_type, called_method.name, bodycl.name, formal[1]))
+                    report("Argument {} passed to method {} in class {} is not conformant to its {} declaration".format(expr.return_type, called_method.name, bodycl.name, formal[1]))
     elif isinstance(expression, While):
-        type_check_expression(expression.predicate, cl)
-        type_check_expression(expression.body, cl)
-        if expression.predicate.return_type != "Bool":
-            raise SemantError("While statement must have boolean conditions")
+        yield expression.predicate
+        yield expression.body
+        if not has_type(expression.predicate, "Bool"):
+            report("While statement must have boolean conditions")
     elif isinstance(expression, Isvoid):
-        type_check_expression(expression.body, cl)
+        yield expression.body
     elif isinstance(expression, Not):
-        type_check_expression(expression.body, cl)
-        if expression.body.return_type != "Bool":
-            raise SemantError("Not statement require boolean values")
+        yield expression.body
+        if not has_type(expression.body, "Bool"):
+            report("Not statement require boolean values")
     elif isinstance(expression, Lt) or isinstance(expression, Le):
-        type_check_expression(expression.first, cl)
-        type_check_expression(expression.second, cl)
-        if expression.first.return_type != "Int" or expression.second.return_type != "Int":
-            raise SemantError("Non-integer arguments cannot be check with < == or <=")
+        yield expression.first
+        yield expression.second
+        if not has_type(expression.first, "Int") or not has_type(expression.second, "Int"):
+            report("Non-integer arguments cannot be check with < == or <=")
     elif isinstance(expression, Neg):
-        type_check_expression(expression.body, cl)
-        if expression.body.return_type != "Int":
-            raise SemantError("Negative statement require integer values")
+        yield expression.body
+        if not has_type(expression.body, "Int"):
+            report("Negative statement require integer values")
     elif any(isinstance(expression, X) for X in [Plus, Sub, Mult, Div]):
-        type_check_expression(expression.first, cl)
-        type_check_expression(expression.second, cl)
-        if expression.first.return_type != "Int" or expression.second.return_type != "Int":
-            raise SemantError("Arithmetic operations require integers")
+        yield expression.first
+        yield expression.second
+        if not has_type(expression.first, "Int") or not has_type(expression.second, "Int"):
+            report("Arithmetic operations require integers")
     elif isinstance(expression, Eq):
-        type_check_expression(expression.first, cl)
-        type_check_expression(expression.second, cl)
+        yield expression.first
+        yield expression.second
         type1 = expression.first.return_type
         type2 = expression.second.return_type
-        if (type1 == "Int" and type2 == "Int") or \
+        if ERROR_TYPE in (type1, type2) or \
+           (type1 == "Int" and type2 == "Int") or \
            (type1 == "Bool" and type2 == "Bool") or \
            (type1 == "String" and type2 == "String"):
             pass  # comparing basic types together is ok
         else:
-            raise SemantError("Comparison is only possible among same base types")
-
-
-def semant(ast):
-    install_base_classes(ast)
-    build_inheritance_graph(ast)
-    check_for_undefined_classes()
-    impede_inheritance_from_base_classes()
-    check_for_inheritance_cycles()
-    expand_inherited_classes()
-    for cl in classes_dict.values():
-        check_scopes_and_infer_return_types(cl)
-    for cl in classes_dict.values():
-        type_check(cl)
-    return classes_dict
+            report("Comparison is only possible among same base types")
+
+
+def semant(ast, all_errors=False):
+    """check the program and return the ClassTable of its classes
+
+    by default the first semantic error is raised, with all_errors every check
+    runs and all the errors found are raised together as SemantErrors"""
+    global diagnostics, class_table
+    base_classes_dict, base_graph = prelude()
+    diagnostics = [] if all_errors else None
+    try:
+        build_inheritance_graph(ast, base_classes_dict, base_graph)
+        check_for_undefined_classes()
+        impede_inheritance_from_base_classes()
+        check_for_inheritance_cycles()
+        if diagnostics:
+            # the remaining checks walk the hierarchy, so it must be sound
+            raise SemantErrors(diagnostics)
+        # base classes are already expanded and checked, only user classes
+        # are left to do
+        for clname in base_classes_dict:
+            for childc in inheritance_graph[clname]:
+                if childc not in base_classes_dict:
+                    expand_inherited_classes(childc)
+        class_table = ClassTable(classes_dict, inheritance_graph)
+        user_classes = classes_dict.maps[0].values()
+        for cl in user_classes:
+            check_scopes_and_infer_return_types(cl)
+        for cl in user_classes:
+            type_check(cl)
+        if diagnostics:
+            raise SemantErrors(diagnostics)
+    finally:
+        diagnostics = None
+    return class_table
 
 
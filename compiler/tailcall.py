@@ -0,0 +1,62 @@
+"""detection of the calls in tail position
+
+COOL has no for loop, methods often iterate by calling themselves as the
+last expression of a block or in a branch of an if or a case. Lowering joins
+the branches in a block that boxes the value and returns it, so a call is in
+tail position when the instructions following it, across the jumps to the
+join blocks, only copy, unbox and box its result before returning it. Such a
+call is marked as tail and followed by the Return of its own result, the
+code generator then reuses the frame of the caller for the callee.
+
+runs after inlining: inlining a function turns its Returns into jumps, a
+call marked in it would no longer be in tail position.
+"""
+from . import ir
+
+
+def returns_result(blocks, block, start, result):
+    """whether the instructions from start in block only return the object
+    held by result, or an Int or Bool object with the same value"""
+    objects = {result}  # temporaries holding the result
+    words = set()  # temporaries holding the word in it
+    visited = {block.label}
+    while True:
+        for instruction in block.instructions[start:]:
+            if isinstance(instruction, ir.Jump) and instruction.target not in visited:
+                block = blocks[instruction.target]
+                visited.add(block.label)
+                start = 0
+                break
+            elif isinstance(instruction, ir.Return):
+                return instruction.src in objects
+            elif isinstance(instruction, ir.Move) and (instruction.src in objects or instruction.src in words):
+                held = objects if instruction.src in objects else words
+                objects.discard(instruction.dest)
+                words.discard(instruction.dest)
+                held.add(instruction.dest)
+            elif isinstance(instruction, ir.Unbox) and instruction.src in objects:
+                words.add(instruction.dest)
+            elif isinstance(instruction, ir.Box) and instruction.src in words:
+                objects.add(instruction.dest)
+            else:
+                return False
+        else:
+            return False  # a block without terminator
+
+
+def mark_tail_calls(program):
+    """mark the calls in tail position and return their result at once"""
+    marked = 0
+    for function in program.functions:
+        blocks = {block.label: block for block in function.blocks}
+        for block in function.blocks:
+            for i, instruction in enumerate(block.instructions):
+                if not isinstance(instruction, (ir.Call, ir.VirtualCall)):
+                    continue
+                if returns_result(blocks, block, i + 1, instruction.dest):
+                    block.instructions[i:] = [instruction._replace(tail=True), ir.Return(instruction.dest)]
+                    marked += 1
+                    break
+        # the join blocks only reached from tail calls
+        ir.remove_unreachable_blocks(function)
+    program.statistics["tail calls"] = marked
@@ -0,0 +1,50 @@
+"""helpers to traverse the ast without recursing in python
+
+Visitors are written as generators: every child node the visitor wants to
+traverse is yielded, and the result of visiting that child is sent back in.
+`walk` keeps the suspended visitors on an explicit stack, so arbitrarily deep
+ast (long chains of + or nested lets) never hit the interpreter recursion
+limit.
+"""
+
+
+def walk(visit, node, *args):
+    """visit node with the generator function visit, returning its result"""
+    stack = [visit(node, *args)]
+    result = None
+    while stack:
+        try:
+            child = stack[-1].send(result)
+        except StopIteration as stop:
+            stack.pop()
+            result = stop.value
+        else:
+            stack.append(visit(child, *args))
+            result = None
+    return result
+
+
+def _copy_node(node):
+    if isinstance(node, list):
+        copied = []
+        for item in node:
+            copied.append((yield item))
+        return copied
+    if isinstance(node, tuple):
+        fields = []
+        for item in node:
+            fields.append((yield item))
+        if hasattr(node, '_fields'):
+            copied = type(node)(*fields)
+            # extra information stored by the compiler (return_type, ...)
+            extra = getattr(node, '__dict__', None)
+            if extra:
+                copied.__dict__.update(extra)
+            return copied
+        return tuple(fields)
+    return node
+
+
+def copy_tree(node):
+    """deep copy of an ast node, equivalent to copy.deepcopy"""
+    return walk(_copy_node, node)
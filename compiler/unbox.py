@@ -0,0 +1,178 @@
+"""removal of the boxes of Int and Bool values that are unboxed at once
+
+lowering boxes words only where they escape, but once a function is inlined
+the box made for its argument or its result is often unboxed right away in
+the same function. An Unbox of a temporary defined once, by a Box or by a
+copy of such a temporary, is replaced by a copy of the boxed word when that
+word is itself defined once, so it cannot have changed since. The boxes
+left without uses are removed with the other useless instructions.
+
+the collectors of the runtime take every word of the stack and of the callee
+saved registers that looks like a pointer for one, and move the objects they
+find. With a collector, the words that must survive an instruction that may
+allocate are boxed again: the temporary holds an Int object, the word being
+boxed after every definition and unboxed before every use.
+"""
+import bisect
+from . import ir
+
+
+def is_pure(instruction):
+    """whether the only effect of instruction is defining its destination,
+    a division may trap on zero"""
+    if isinstance(instruction, ir.BinOp):
+        return instruction.op != "div"
+    return isinstance(instruction, (ir.LoadConst, ir.LoadImm, ir.Move, ir.UnOp, ir.Box, ir.Unbox))
+
+
+def single_definitions(function):
+    """the instruction defining each temporary that is defined only once"""
+    definitions = {}
+    count = {param: 1 for param in function.params}
+    for block in function.blocks:
+        for instruction in block.instructions:
+            for temp in ir.defs(instruction):
+                count[temp] = count.get(temp, 0) + 1
+                definitions[temp] = instruction
+    return {temp: instruction for temp, instruction in definitions.items() if count[temp] == 1}
+
+
+def boxed_word(temp, definitions):
+    """the word boxed in the object held by temp, None if unknown"""
+    while isinstance(definitions.get(temp), ir.Move):
+        temp = definitions[temp].src
+    box = definitions.get(temp)
+    if isinstance(box, ir.Box) and box.src in definitions:
+        return box.src
+    return None
+
+
+def remove_useless_instructions(function):
+    """remove the pure instructions whose result is never used, returns how
+    many boxes were removed"""
+    removed_boxes = 0
+    changed = True
+    while changed:
+        changed = False
+        used = set()
+        for block in function.blocks:
+            for instruction in block.instructions:
+                used.update(ir.uses(instruction))
+        for block in function.blocks:
+            kept = []
+            for instruction in block.instructions:
+                if is_pure(instruction) and instruction.dest not in used:
+                    removed_boxes += isinstance(instruction, ir.Box)
+                    changed = True
+                else:
+                    kept.append(instruction)
+            block.instructions[:] = kept
+    return removed_boxes
+
+
+def remove_boxing(program):
+    """forward the words of the boxes that are unboxed in the same function"""
+    removed = 0
+    for function in program.functions:
+        definitions = single_definitions(function)
+        for block in function.blocks:
+            for i, instruction in enumerate(block.instructions):
+                if isinstance(instruction, ir.Unbox):
+                    word = boxed_word(instruction.src, definitions)
+                    if word is not None:
+                        block.instructions[i] = ir.Move(instruction.dest, word)
+        removed += remove_useless_instructions(function)
+    program.statistics["removed boxes"] = removed
+
+
+# definitions that may leave a pointer in their destination
+POINTER_DEFINITIONS = (ir.LoadConst, ir.LoadField, ir.Box, ir.Alloc, ir.Call, ir.VirtualCall)
+
+
+def may_collect(instruction):
+    """whether the collector may run during instruction, any method may
+    allocate"""
+    if isinstance(instruction, ir.Box):
+        return instruction.type == "Int"
+    return isinstance(instruction, (ir.Alloc, ir.Call, ir.VirtualCall))
+
+
+def word_temporaries(function):
+    """the temporaries never holding a pointer"""
+    pointers = set(function.params)
+    defined = set()
+    changed = True
+    while changed:
+        changed = False
+        for block in function.blocks:
+            for instruction in block.instructions:
+                for temp in ir.defs(instruction):
+                    defined.add(temp)
+                    if temp not in pointers and (isinstance(instruction, POINTER_DEFINITIONS) or
+                                                 isinstance(instruction, ir.Move) and instruction.src in pointers):
+                        pointers.add(temp)
+                        changed = True
+    return defined - pointers
+
+
+def words_live_across_allocations(function):
+    """the words whose value must survive an instruction that may allocate"""
+    words = word_temporaries(function)
+    positions = []
+    position = 0
+    for block in function.blocks:
+        for instruction in block.instructions:
+            if may_collect(instruction):
+                positions.append(position)
+            position += 1
+    crossing = set()
+    for temp, (start, end) in ir.live_intervals(function).items():
+        i = bisect.bisect_right(positions, start)
+        if temp in words and i < len(positions) and positions[i] < end:
+            crossing.add(temp)
+    return crossing
+
+
+def boxed_instructions(function, instruction, boxed):
+    """instruction with the temporaries of boxed holding Int objects"""
+    if isinstance(instruction, ir.Move) and instruction.dest in boxed and instruction.src in boxed:
+        return [instruction]
+    instructions = []
+    renaming = {}
+    for temp in ir.uses(instruction):
+        if temp in boxed and temp not in renaming:
+            renaming[temp] = function.new_temp()
+            instructions.append(ir.Unbox(renaming[temp], temp))
+    dest = getattr(instruction, "dest", None)
+    if dest in boxed:
+        word = function.new_temp()
+        instruction = instruction._replace(dest=word)
+    fields = []
+    for value in instruction:
+        if isinstance(value, ir.Temp):
+            value = renaming.get(value, value)
+        elif isinstance(value, list):
+            value = [renaming.get(v, v) for v in value]
+        fields.append(value)
+    instructions.append(type(instruction)(*fields))
+    if dest in boxed:
+        # Bool words too, the object never leaves the function
+        instructions.append(ir.Box(dest, "Int", word))
+    return instructions
+
+
+def box_words_across_allocations(program):
+    """with a collector, keep boxed the words live across an allocation"""
+    if program.gc == "NO_GC":
+        return
+    count = 0
+    for function in program.functions:
+        # the boxes added allocate too
+        crossing = words_live_across_allocations(function)
+        while crossing:
+            count += len(crossing)
+            for block in function.blocks:
+                block.instructions[:] = [boxed for instruction in block.instructions
+                                         for boxed in boxed_instructions(function, instruction, crossing)]
+            crossing = words_live_across_allocations(function)
+    program.statistics["words boxed across allocations"] = count
@@ -0,0 +1,35 @@
+from compiler.parser import parser
+from compiler import semant, codegen, lowering, ir
+
+import io
+
+
+def lower(source, unboxed_attributes=False):
+    """intermediate representation of a program, before any pass"""
+    ast = parser.parse(source)
+    class_table = semant.semant(ast)
+    strings, ints = codegen.build_symbol_tables(class_table.classes)
+    return lowering.lower_program(class_table, strings, ints, unboxed_attributes)
+
+
+def assemble(source, **options):
+    """assembly of a program, options are passed to codegen.cgen"""
+    ast = parser.parse(source)
+    class_table = semant.semant(ast)
+    out = io.StringIO()
+    codegen.cgen(ast, class_table, out, **options)
+    return out.getvalue()
+
+
+def function_named(program, name):
+    return next(f for f in program.functions if f.name == name)
+
+
+def program_with(*blocks):
+    """program of a single function A.f, with self and one formal, made of
+    blocks given as (label, instructions) pairs"""
+    function = ir.Function("A.f", "A", 1)
+    function.blocks.extend(ir.BasicBlock(label, list(instructions)) for label, instructions in blocks)
+    program = ir.Program(None, {}, {})
+    program.functions.append(function)
+    return program, function
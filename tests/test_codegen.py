@@ -0,0 +1,131 @@
+from compiler.parser import parser
+from compiler import semant, codegen, passes, unbox
+from tests import lower, assemble
+
+import io
+import pytest
+
+
+def test_long_expression_chains_compile():
+    # starting from an attribute, so that constant folding keeps the chain
+    program = "class Main { x:Int; main():Int { x + %s }; };" % " + ".join(str(i) for i in range(100000))
+    ast = parser.parse(program)
+    class_table = semant.semant(ast)
+    codegen.cgen(ast, class_table, io.StringIO())
+    strings, ints = codegen.build_symbol_tables(ast)
+    assert len([i for i in ints if i < 100000]) == 100000
+
+
+def test_assembly_is_written_to_the_output_only(capsys):
+    assert "Main_protObj:" in assemble("class Main { main():Int { 1 }; };")
+    assert capsys.readouterr().out == ""
+    assert codegen.code is None
+
+
+def test_ir_dump_and_pass_timings():
+    dump, timings = io.StringIO(), {}
+    assemble("class Main { main():Int { 1 + 2 }; };", ir_dump=dump, pass_timings=timings)
+    assert "*** after lowering" in dump.getvalue()
+    assert "function Main.main(t0)" in dump.getvalue()
+    assert set(timings) == {name for name, _ in passes.pipeline}
+
+
+def test_unboxed_attribute_layout():
+    assembly = assemble("""
+    class Main {
+        n:Int;
+        b:Bool <- true;
+        s:String;
+        main():Int { { n <- n + 1; n; } };
+    };""", unboxed_attributes=True)
+    prototype = assembly.split("Main_protObj:\n")[1].split("\n")[3:6]
+    assert prototype[:2] == ["\t.word 0", "\t.word 0"]
+    assert prototype[2].startswith("\t.word str_const")
+    # only s holds a pointer, and the length of strings
+    assert "Main_gcMap:\n\t.word 3\n\t.word 4\n" in assembly
+    assert "Int_gcMap:\n\t.word 1\n\t.word 0\n" in assembly
+    assert "String_gcMap:\n\t.word 2\n\t.word 1\n" in assembly
+    main = assembly.split("Main.main:\n")[1]
+    assert "Int_protObj" in main  # the result is boxed
+    assert main.count("jal Object.copy") == 1
+
+
+attribute_store = """
+class Main {
+    n:Int;
+    o:Object;
+    main():Object { { n <- n + 1; o <- self; } };
+};"""
+
+
+def test_collector_selection():
+    assembly = assemble(attribute_store, gc="SCN_GC", gc_test=True)
+    assert "_MemMgr_INITIALIZER:\n\t.word _ScnGC_Init\n" in assembly
+    assert "_MemMgr_COLLECTOR:\n\t.word _ScnGC_Collect\n" in assembly
+    assert "_MemMgr_TEST:\n\t.word 1\n" in assembly
+    # only the generational collector needs to know about assignments
+    assert "_GenGC_Assign" not in assembly
+
+
+def test_generational_collector_write_barrier():
+    main = assemble(attribute_store, gc="GEN_GC").split("Main.main:\n")[1]
+    assert main.count("jal _GenGC_Assign") == 2
+    assert "\taddiu $a1, $s0, 12\n\tjal _GenGC_Assign\n" in main
+
+
+def test_unboxed_attributes_are_rejected_with_a_collector():
+    for gc in ["GEN_GC", "SCN_GC"]:
+        with pytest.raises(ValueError):
+            assemble(attribute_store, gc=gc, unboxed_attributes=True)
+
+
+def test_frames_are_cleared_for_collectors():
+    source = "class Main inherits IO { main():Object { out_string(\"x\") }; };"
+    main = assemble(source, gc="GEN_GC").split("Main.main:\n")[1]
+    size = int(main.split("addiu $sp, $sp, -")[1].split("\n")[0])
+    saved = main.split("sw $zero")[0].count("sw $s")
+    # the outgoing argument at least
+    assert main.count("sw $zero") == (size - 8) // 4 - saved >= 1
+    main = assemble(source).split("Main.main:\n")[1]
+    assert "sw $zero" not in main
+
+
+def test_words_live_across_allocations_are_boxed_for_collectors():
+    source = """class Main inherits IO {
+        main():Int { let x:Int <- in_int() * 2 in { out_string("x"); x + 1; } };
+    };"""
+    statistics = {}
+    main = assemble(source, gc="GEN_GC", statistics=statistics).split("Main.main:\n")[1]
+    assert statistics["words boxed across allocations"] >= 1
+    # the words being boxed are kept out of the frame and the registers
+    assert "\tlw $t0, boxed_word\n\tsw $t0, 12($a0)\n" in main
+    program = lower(source)
+    program.gc = "GEN_GC"
+    passes.run_passes(program)
+    assert not [f.name for f in program.functions if unbox.words_live_across_allocations(f)]
+    assert "boxed_word" not in assemble(source)
+
+
+def test_small_objects_are_allocated_inline():
+    source = "class A { x:Int; }; class Main { main():Object { new A }; };"
+    main = assemble(source).split("Main.main:\n")[1]
+    assert "\taddiu $t1, $gp, 20\n\tbgtu $t1, $s7, " in main
+    assert main.count("\tlw $t2, ") == 4  # the words of the prototype
+    # the runtime is called when the heap is full
+    assert main.count("jal Object.copy") == 1
+    main = assemble(source, gc="GEN_GC", gc_test=True).split("Main.main:\n")[1]
+    assert "$gp" not in main and "jal Object.copy" in main
+
+
+def test_large_objects_are_copied_by_the_runtime():
+    attributes = " ".join("a%d:Int;" % i for i in range(codegen.INLINE_ALLOCATION_WORDS))
+    main = assemble("class A { %s }; class Main { main():Object { new A }; };" % attributes)
+    assert "$gp" not in main.split("Main.main:\n")[1]
+
+
+def test_init_functions_never_called_are_left_out():
+    assembly = assemble("class A { }; class Main { main():Object { new A }; };")
+    assert "A_init:" not in assembly
+    table = assembly.split("class_objTab:\n")[1].split(":")[0].split("\n")
+    assert "\t.word A_protObj" in table
+    assert table[table.index("\t.word A_protObj") + 1] == "\t.word 0"
@@ -0,0 +1,81 @@
+from compiler.parser import parser
+from compiler.parser import Int, Bool, Str, Plus, Let, Object, Div
+from compiler import semant, codegen, constfold
+from tests import assemble
+
+
+def folded(expression, program="class Main { x:Int; main():Object { %s }; };"):
+    ast = parser.parse(program % expression)
+    class_table = semant.semant(ast)
+    constfold.fold_constants(class_table)
+    main = class_table.classes[class_table.ids["Main"]]
+    return [f for f in main.feature_list if f.name == "main"][0].body
+
+
+def test_arithmetic_on_literals_is_folded():
+    assert folded("1 + 2 * 3") == Int(7)
+    assert folded("~(10 - 3)") == Int(-7)
+    assert folded("7 / 2") == Int(3)
+    assert folded("~7 / 2") == Int(-3)
+    assert folded("2147483647 + 1") == Int(-2147483648)
+
+
+def test_division_by_zero_is_left_to_runtime():
+    assert isinstance(folded("1 / 0"), Div)
+
+
+def test_comparisons_on_literals_are_folded():
+    assert folded("1 < 2") == Bool(True)
+    assert folded("not (2 <= 1)") == Bool(True)
+    assert folded("1 + 1 = 2") == Bool(True)
+    assert folded('"a" = "b"') == Bool(False)
+
+
+def test_folded_nodes_are_typed():
+    assert folded("1 + 2").return_type == "Int"
+    assert folded("1 < 2").return_type == "Bool"
+
+
+def test_dead_if_branches_are_pruned():
+    assert folded("if 1 < 2 then x else 3 fi") == Object("x")
+    assert folded("if not true then x else 3 fi") == Int(3)
+
+
+def test_pruned_branch_of_another_type_narrows_the_enclosing_block():
+    block = folded('{ 1; if true then 2 else "s" fi; }')
+    assert block.body[-1] == Int(2)
+    assert block.return_type == "Int"
+    let = folded('let s:String <- "s" in { s <- "t"; if false then s else 2 fi; }')
+    assert let.return_type == "Int"
+    # the object main returns is an Int, boxed
+    assembly = assemble('class Main { main():Object { { 1; if true then 2 else "s" fi; } }; };')
+    assert "Int_protObj" in assembly.split("Main.main:\n")[1]
+
+
+def test_constants_are_propagated_through_lets():
+    assert folded("let a:Int <- 2, b:Int <- a * 3 in a + b") == Int(8)
+    assert folded('let s:String <- "a" in s') == Str("a")
+
+
+def test_assigned_or_shadowed_lets_are_kept():
+    body = folded("let a:Int <- 2 in { a <- a + 1; a; }")
+    assert isinstance(body, Let) and body.init == Int(2)
+    body = folded("let a:Int <- 2 in let a:Int <- x in a + 1")
+    assert body == Let("a", "Int", Object("x"), Plus(Object("a"), Int(1)))
+
+
+def test_folded_constants_are_in_the_constant_table():
+    program = "class Main { main():Int { 40 + 2 }; };"
+    ast = parser.parse(program)
+    class_table = semant.semant(ast)
+    constfold.fold_constants(class_table)
+    strings, ints = codegen.build_symbol_tables(class_table.classes)
+    assert 42 in ints and 40 not in ints
+
+
+def test_attribute_initializers_are_folded():
+    ast = parser.parse("class A { a:Int <- 6 * 7; }; class Main inherits A { main():Int { a }; };")
+    class_table = semant.semant(ast)
+    constfold.fold_constants(class_table)
+    for clname in ["A", "Main"]:
+        assert class_table.attributes[class_table.ids[clname]][0].body == Int(42)
@@ -0,0 +1,63 @@
+from compiler import inline, ir
+from compiler.reachability import remove_dead_code
+from compiler.devirtualize import devirtualize
+from tests import lower, function_named, assemble
+
+
+def devirtualized(source):
+    program = lower(source)
+    remove_dead_code(program)
+    devirtualize(program)
+    return program
+
+
+def calls(program, name):
+    function = function_named(program, name)
+    return [i for block in function.blocks for i in block.instructions
+            if isinstance(i, (ir.Call, ir.VirtualCall))]
+
+
+def test_single_implementation_is_called_directly():
+    program = devirtualized("""
+    class A { f():Int { 1 }; };
+    class B inherits A { };
+    class Main { a:A <- new B; main():Int { a.f() }; };
+    """)
+    call, = calls(program, "Main.main")
+    assert isinstance(call, ir.Call) and call.target == "A.f"
+    assert program.statistics == {"dispatches": 1, "devirtualized dispatches": 1}
+
+
+def test_override_in_instantiated_subclass_stays_virtual():
+    program = devirtualized("""
+    class A { f():Int { 1 }; };
+    class B inherits A { f():Int { 2 }; };
+    class Main { a:A <- if true then new A else new B fi; main():Int { a.f() }; };
+    """)
+    call, = calls(program, "Main.main")
+    assert isinstance(call, ir.VirtualCall)
+    assert program.statistics["devirtualized dispatches"] == 0
+
+
+def test_override_in_class_never_instantiated_is_ignored():
+    program = devirtualized("""
+    class A { f():Int { 1 }; };
+    class B inherits A { f():Int { 2 }; };
+    class Main { a:A <- new A; main():Int { a.f() }; };
+    """)
+    call, = calls(program, "Main.main")
+    assert isinstance(call, ir.Call) and call.target == "A.f"
+
+
+def test_devirtualized_call_in_assembly(monkeypatch):
+    # keep the calls, small methods would be inlined
+    monkeypatch.setattr(inline, "INLINE_BUDGET", 0)
+    source = """
+    class A { f():Int { 1 }; };
+    class Main { main():Int { (new A).f() }; };
+    """
+    statistics = {}
+    assembly = assemble(source, statistics=statistics)
+    # in tail position, the call is a jump
+    assert "\tj A.f\n" in assembly
+    assert statistics["devirtualized dispatches"] == 1
@@ -0,0 +1,74 @@
+from compiler import passes, inline, ir
+from tests import lower, function_named
+
+
+def optimize(source):
+    program = lower(source)
+    passes.run_passes(program)
+    return program
+
+
+def instructions(function):
+    return [i for block in function.blocks for i in block.instructions]
+
+
+def call_targets(function):
+    return [i.target for i in instructions(function) if isinstance(i, ir.Call)]
+
+
+point = """
+class Point {
+    x:Int;
+    get_x():Int { x };
+    set_x(v:Int):Point { { x <- v; self; } };
+    bump(v:Int):Int { { v <- v + 1; v; } };
+};
+class Main {
+    p:Point <- new Point;
+    main():Int { let n:Int <- p.get_x() in { p.set_x(n); p.bump(n); n; } };
+};
+"""
+
+
+def test_getters_and_setters_are_inlined():
+    program = optimize(point)
+    main = function_named(program, "Main.main")
+    assert not any(target.startswith("Point.") for target in call_targets(main))
+    assert program.statistics["inlined calls"] >= 3
+    # only called directly and inlined everywhere
+    assert "Point.get_x" not in {f.name for f in program.functions}
+
+
+def test_assigned_formal_does_not_change_the_argument():
+    callee = ir.Function("A.bump", "A", 1)
+    self, v = callee.params
+    callee.blocks.append(ir.BasicBlock("bump", [ir.BinOp(v, "add", v, 1), ir.Return(v)]))
+    caller = ir.Function("A.f", "A", 0)
+    n, result = caller.new_temp(), caller.new_temp()
+    caller.blocks.append(ir.BasicBlock("f", [
+        ir.LoadImm(n, 5), ir.Call(result, "A.bump", [caller.params[0], n]), ir.Return(n)]))
+    inline.inline_call(caller, 0, 1, callee)
+    assert [i for i in instructions(caller) if n in ir.defs(i)] == [ir.LoadImm(n, 5)]
+    assert not any(isinstance(i, ir.Call) for i in instructions(caller))
+    # the return of the callee continues with the rest of the block
+    assert caller.blocks[-1].instructions == [ir.Return(n)]
+
+
+def test_recursive_calls_are_not_inlined():
+    program = optimize("""
+    class A { f(n:Int):Int { if n = 0 then 0 else f(n - 1) fi }; };
+    class Main { main():Int { (new A).f(3) }; };
+    """)
+    assert "A.f" in call_targets(function_named(program, "A.f"))
+
+
+def test_large_callees_are_not_inlined(monkeypatch):
+    monkeypatch.setattr(inline, "INLINE_SIZE_LIMIT", 1)
+    program = optimize(point)
+    assert "Point.bump" in call_targets(function_named(program, "Main.main"))
+
+
+def test_budget_bounds_growth(monkeypatch):
+    monkeypatch.setattr(inline, "INLINE_BUDGET", 0)
+    program = optimize(point)
+    assert program.statistics["inlined calls"] == 0
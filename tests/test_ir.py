@@ -0,0 +1,57 @@
+from compiler import ir, passes
+
+
+def function_with_blocks(*blocks):
+    function = ir.Function("A.f", "A", 0)
+    for label, instructions in blocks:
+        function.blocks.append(ir.BasicBlock(label, instructions))
+    return function
+
+
+def test_uses_and_defs():
+    a, b, c = ir.Temp(0), ir.Temp(1), ir.Temp(2)
+    assert ir.defs(ir.BinOp(c, "add", a, b)) == [c]
+    assert ir.uses(ir.BinOp(c, "add", a, 1)) == [a]
+    assert ir.uses(ir.Call(c, a, [b])) == [a, b]
+    assert ir.defs(ir.StoreField(a, 12, b)) == []
+
+
+def test_liveness_across_a_loop():
+    function = function_with_blocks(
+        ("entry", [ir.LoadImm(ir.Temp(1), 0), ir.LoadImm(ir.Temp(2), 5), ir.Jump("loop")]),
+        ("loop", [ir.Branch("lt", ir.Temp(1), ir.Temp(2), "body", "done")]),
+        ("body", [ir.BinOp(ir.Temp(1), "add", ir.Temp(1), 1), ir.Jump("loop")]),
+        ("done", [ir.Return(ir.Temp(1))]),
+    )
+    live_in, live_out = ir.liveness(function)
+    assert live_in["loop"] == {ir.Temp(1), ir.Temp(2)}
+    assert live_out["body"] == {ir.Temp(1), ir.Temp(2)}
+    assert live_in["done"] == {ir.Temp(1)}
+    intervals = ir.live_intervals(function)
+    # the bound is live until the end of the loop body
+    assert intervals[ir.Temp(2)] == (1, 5)
+
+
+def test_unreachable_blocks_are_removed():
+    function = function_with_blocks(
+        ("entry", [ir.Jump("done")]),
+        ("dead", [ir.Jump("done")]),
+        ("done", [ir.Return(ir.Temp(0))]),
+    )
+    ir.remove_unreachable_blocks(function)
+    assert [block.label for block in function.blocks] == ["entry", "done"]
+
+
+def test_format_function():
+    function = function_with_blocks(("entry", [ir.LoadImm(ir.Temp(1), 0), ir.Return(ir.Temp(1))]))
+    assert ir.format_function(function) == "function A.f(t0)\n  entry:\n    t1 = LoadImm 0\n    Return t1\n"
+
+
+def test_pass_manager_runs_the_pipeline_in_order(monkeypatch):
+    ran = []
+    monkeypatch.setattr(passes, "pipeline", [("first", lambda p: ran.append(1)), ("second", lambda p: ran.append(2))])
+    program = ir.Program(None, {}, {})
+    timings = {}
+    passes.run_passes(program, timings=timings)
+    assert ran == [1, 2]
+    assert list(timings) == ["first", "second"]
@@ -0,0 +1,107 @@
+from compiler import ir, loops, devirtualize
+from tests import lower, function_named, assemble
+
+import re
+
+
+def optimized_main(source):
+    program = lower(source)
+    devirtualize.devirtualize(program)
+    loops.reduce_strength(program)
+    loops.hoist_loop_invariants(program)
+    main = function_named(program, "Main.main")
+    return program, main
+
+
+def loop_instructions(function):
+    found = []
+    for header, body in loops.natural_loops(function).items():
+        found.extend(i for block in function.blocks if block.label in body for i in block.instructions)
+    return found
+
+
+def test_natural_loops_of_nested_whiles():
+    program = lower("""class Main { main():Object {
+        let i:Int <- 0, j:Int in while i < 10 loop { j <- 0; while j < i loop j <- j + 1 pool; i <- i + 1; } pool
+    }; };""")
+    main = function_named(program, "Main.main")
+    found = sorted(loops.natural_loops(main).values(), key=len)
+    assert len(found) == 2 and found[0] < found[1]
+    assert main.blocks[0].label not in found[1]
+
+
+def test_constants_and_attribute_reads_are_hoisted():
+    program, main = optimized_main("""class Main {
+        scale:Int <- 3;
+        s:String <- "hello";
+        main():Int { let i:Int <- 0, acc:Int <- 0 in {
+            while i < 100 loop { acc <- acc + scale * 7 + s.length(); i <- i + 1; } pool;
+            acc;
+        } };
+    };""")
+    inside = loop_instructions(main)
+    assert not [i for i in inside if isinstance(i, (ir.LoadImm, ir.LoadField, ir.Unbox))]
+    assert not [i for i in inside if isinstance(i, ir.BinOp) and i.op == "mul"]
+    assert not [i for i in inside if isinstance(i, ir.Call)]
+    # the dispatch still checks its receiver
+    assert [i for i in inside if isinstance(i, ir.CheckVoid)]
+    assert program.statistics["hoisted instructions"] >= 8
+
+
+def test_assigned_attributes_and_calls_keep_reads_in_the_loop():
+    program, main = optimized_main("""class Main {
+        n:Int;
+        m:Int;
+        bump():Object { m <- m + 1 };
+        main():Int { { while n < 10 loop n <- n + 1 pool; while m < 10 loop bump() pool; m; } };
+    };""")
+    offsets = [i.offset for i in loop_instructions(main) if isinstance(i, ir.LoadField)]
+    assert sorted(offsets) == [12, 12, 16]
+
+
+def test_multiplications_and_divisions_by_powers_of_two_are_shifts():
+    program, main = optimized_main("""class Main { main():Int {
+        let i:Int <- 0, x:Int <- 0 in { while i < 100 loop { x <- x + i * 8 + 2 * i + i / 4 + i / 3; i <- i + 1; } pool; x; }
+    }; };""")
+    ops = [i.op for i in loop_instructions(main) if isinstance(i, ir.BinOp)]
+    assert ops.count("sll") == 2 and "mul" not in ops
+    assert ops.count("div") == 1  # by 3
+    assert program.statistics["strength reduced operations"] == 3
+    # the constants left without uses are removed
+    assert not [i for i in loop_instructions(main) if isinstance(i, ir.LoadImm) and i.value in (8, 2, 4)]
+
+
+def test_division_by_a_power_of_two_truncates_towards_zero():
+    function = ir.Function("A.f", "A", 1)
+    dividend = function.params[1]
+    for divisor in [1, 2, 8, 2 ** 30]:
+        shift = divisor.bit_length() - 1
+        instructions = loops.reduced(function, ir.BinOp(ir.Temp(99), "div", dividend, divisor), {})
+        for value in [0, 1, 7, -1, -7, -8, -9, 2 ** 31 - 1, -2 ** 31]:
+            words = {dividend: value}
+            for instruction in instructions:
+                if isinstance(instruction, ir.Move):
+                    words[instruction.dest] = words[instruction.src]
+                    continue
+                first = words[instruction.first]
+                second = words.get(instruction.second, instruction.second)
+                if instruction.op == "sra":
+                    words[instruction.dest] = first >> second
+                elif instruction.op == "srl":
+                    words[instruction.dest] = (first % 2 ** 32) >> second
+                else:
+                    words[instruction.dest] = first + second
+            quotient = abs(value) // divisor
+            assert words[ir.Temp(99)] == (quotient if value >= 0 else -quotient), (value, divisor)
+        assert len(instructions) == (1 if shift == 0 else 4)
+
+
+def test_loop_kernel_in_assembly():
+    main = assemble("""class Main { main():Int {
+        let i:Int <- 0, x:Int <- 0 in { while i < 100 loop { x <- x + i * 4; i <- i + 1; } pool; x; }
+    }; };""").split("Main.main:\n")[1]
+    header = re.search(r"\n(label\d+):\n", main).group(1)
+    loop = main.split(header + ":\n")[1].split("\tb %s\n" % header)[0]
+    assert "\tsll " in loop and "\tmul " not in main
+    # 100 and 1 are loaded once
+    assert "\tli " not in loop
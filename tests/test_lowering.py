@@ -0,0 +1,120 @@
+from compiler import lowering, ir
+from tests import lower, function_named
+
+
+def instructions(function, kind):
+    return [i for block in function.blocks for i in block.instructions if isinstance(i, kind)]
+
+
+def test_functions_for_init_and_methods_with_a_body():
+    program = lower("class Main { main():Int { 1 }; };")
+    names = [f.name for f in program.functions]
+    assert names[:5] == ["Object_init", "IO_init", "Int_init", "Bool_init", "String_init"]
+    assert "Main_init" in names and "Main.main" in names
+    assert "Object.abort" not in names
+
+
+def test_blocks_end_with_one_terminator():
+    program = lower("""class Main { main():Object {
+        { while 0 < 1 loop if true then 1 else case 3 of x:Int => x; esac fi pool; 0; }
+    }; };""")
+    for function in program.functions:
+        for block in function.blocks:
+            assert isinstance(block.instructions[-1], ir.TERMINATORS)
+            assert not any(isinstance(i, ir.TERMINATORS) for i in block.instructions[:-1])
+
+
+def test_arithmetic_works_on_unboxed_values():
+    main = function_named(lower("class Main { main():Int { 1 + 2 }; };"), "Main.main")
+    kinds = [type(i) for i in main.blocks[0].instructions]
+    assert kinds == [ir.LoadImm, ir.LoadImm, ir.BinOp, ir.Box, ir.Return]
+
+
+def test_init_functions_are_flattened():
+    program = lower("""
+    class A { a:Int <- 3; };
+    class Main inherits A { b:Int; c:Int <- a + 1; main():Object { { new A; new Main; new IO; } }; };
+    """)
+    init = function_named(program, "Main_init")
+    assert instructions(init, ir.Call) == []
+    # the inherited initializer first
+    assert [s.offset for s in instructions(init, ir.StoreField)] == [12, 20]
+    # IO has no initializer, the prototype is copied only
+    calls = instructions(function_named(program, "Main.main"), ir.Call)
+    assert [call.target for call in calls] == ["A_init", "Main_init"]
+
+
+def test_case_intervals_map_tags_to_most_specific_branch():
+    # Object 0..5, A 2..4, B 3..3, unmatched class 6
+    intervals = lowering.case_intervals([(2, 4), (0, 5), (3, 3)])
+    assert intervals == [(0, 1), (2, 0), (3, 2), (4, 0), (5, 1), (6, None)]
+
+
+def test_case_intervals_without_catch_all_branch():
+    intervals = lowering.case_intervals([(3, 3), (5, 7)])
+    assert intervals == [(0, None), (3, 0), (4, None), (5, 1), (8, None)]
+
+
+case_program = """
+class A { };
+class B inherits A { };
+class C inherits A { };
+class D inherits B { };
+class E { };
+class Main {
+  main():Object {
+    case new D of
+      %s
+    esac
+  };
+};
+"""
+
+
+def test_small_case_tests_most_specific_branch_first():
+    main = function_named(lower(case_program % "x:A => 1; x:D => 2; x:Object => 3;"), "Main.main")
+    ids = {"Object": 0, "A": 5, "B": 6, "D": 7}
+    checks = [i.second for i in instructions(main, ir.BinOp) if i.op == "sub"]
+    assert checks == [ids[name] for name in ["D", "A", "Object"]]
+    assert all(b.op == "leu" for b in instructions(main, ir.Branch))
+
+
+def test_large_case_uses_binary_search_on_tags():
+    main = function_named(lower(case_program % " ".join(
+        "x:%s => %d;" % (name, i) for i, name in enumerate(["A", "B", "C", "D", "E", "Object"]))), "Main.main")
+    assert not [i for i in instructions(main, ir.BinOp) if i.op == "sub"]
+    # Object (with Main), A, B, D, C, E and the unmatched tags past Main
+    # are 8 intervals, told apart by 7 comparisons
+    assert len([b for b in instructions(main, ir.Branch) if b.op == "lt"]) == 7
+    assert len(instructions(main, ir.CaseAbort)) == 1
+
+
+def test_int_and_bool_locals_are_unboxed():
+    main = function_named(lower("""class Main { main():Int {
+        let i:Int <- 0, b:Bool <- true in { while b loop { i <- i + 1; b <- i < 10; } pool; i; }
+    }; };"""), "Main.main")
+    # only the result escapes
+    assert [i.type for i in instructions(main, ir.Box)] == ["Int"]
+    assert instructions(main, ir.Unbox) == []
+
+
+def test_values_are_boxed_where_they_escape():
+    program = lower("""class Main {
+        n:Int;
+        o:Object;
+        f(k:Int, x:Object):Int { k };
+        main():Object { { n <- 1; o <- 2; f(3, 4); if true then 5 else "five" fi; } };
+    };""")
+    main = function_named(program, "Main.main")
+    # the attributes, the arguments and the branch of a more general if
+    assert len(instructions(main, ir.Box)) == 5
+    # the formal is unboxed once on entry
+    f = function_named(program, "Main.f")
+    assert instructions(f, ir.Unbox) == [ir.Unbox(ir.Temp(3), f.params[1])]
+
+
+def test_unboxed_attributes_are_words():
+    program = lower("class Main { n:Int; main():Int { { n <- n + 1; n; } }; };", unboxed_attributes=True)
+    main = function_named(program, "Main.main")
+    assert instructions(main, ir.Unbox) == []
+    assert len(instructions(main, ir.Box)) == 1  # the result
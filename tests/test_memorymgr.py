@@ -0,0 +1,44 @@
+from compiler import memorymgr as mm
+from compiler import ir
+from tests import lower, function_named
+
+
+def slot_count(expression):
+    """frame slots used by the temporaries of a method with body expression"""
+    program = "class Main { main():Int { 0 }; f(x:Int, y:Int):Object { %s }; };" % expression
+    function = function_named(lower(program), "Main.f")
+    intervals = ir.live_intervals(function)
+    for param in function.params:
+        intervals.pop(param, None)
+    return mm.assign_slots(intervals)[1]
+
+
+def test_frame_layout():
+    assert mm.frame_size(1, 2, 3) == 8 + 4 * 6
+    assert mm.saved_register_operand(0) == "-8($fp)"
+    assert mm.slot_operand(0, 1) == "-12($fp)"
+    assert mm.slot_operand(2, 0) == "-16($fp)"
+    assert mm.argument_operand(0, 2) == "8($fp)"
+    assert mm.argument_operand(1, 2) == "4($fp)"
+    assert mm.outgoing_operand(0, 3) == "12($sp)"
+
+
+def test_slots_are_shared_by_disjoint_intervals():
+    a, b, c, d = (ir.Temp(i) for i in range(4))
+    slots, count = mm.assign_slots({a: (0, 2), b: (1, 3), c: (2, 5), d: (4, 6)})
+    assert count == 2
+    # c is defined where a dies, d where b dies
+    assert slots[c] == slots[a] and slots[d] == slots[b]
+
+
+def test_expressions_reuse_slots():
+    # left nested operations need the same slots however long they are
+    assert slot_count("x + y + 1") == slot_count("x + y + 1 + 2 + 3 + 4 + 5")
+
+
+def test_sibling_scopes_share_slots():
+    # Int formals are unboxed in temporaries live as long as they are used
+    single = slot_count("let a:Int <- 1 + 2 in a * 2")
+    assert slot_count("{ let a:Int <- 1 + 2 in a * 2; let b:Int <- 3 + 4 in b * 2; }") == single
+    assert slot_count("case x of a:Int => a * 2; b:Object => 0; c:String => c; esac") \
+        <= slot_count("case x of a:Int => a * 2; esac") + 1
@@ -0,0 +1,61 @@
+from compiler import peephole
+
+
+def optimize(text):
+    statistics = {}
+    items = peephole.optimize(peephole.parse(text), statistics)
+    return peephole.format_items(items), statistics.get("peephole removed instructions", 0)
+
+
+def test_parse_and_format_round_trip():
+    text = "f:\n\tsw $fp, 0($sp) # frame pointer\n\tjal Object.copy\n\tjr $ra\n"
+    items = peephole.parse(text)
+    assert items[1] == peephole.Instruction("sw", ["$fp", "0($sp)"], "frame pointer")
+    assert peephole.format_items(items) == text
+
+
+def test_store_then_load_of_the_same_register():
+    assert optimize("f:\n\tsw $t0, -12($fp)\n\tlw $t0, -12($fp)\n") == ("f:\n\tsw $t0, -12($fp)\n", 1)
+
+
+def test_store_then_load_in_another_register():
+    assert optimize("f:\n\tsw $t1, -12($fp)\n\tlw $t0, -12($fp)\n") == \
+        ("f:\n\tsw $t1, -12($fp)\n\tmove $t0, $t1\n", 0)
+
+
+def test_load_then_store():
+    assert optimize("f:\n\tlw $t0, 12($s0)\n\tsw $t0, 12($s0)\n") == ("f:\n\tlw $t0, 12($s0)\n", 1)
+    # the address changed with the load
+    text = "f:\n\tlw $t0, 12($t0)\n\tsw $t0, 12($t0)\n"
+    assert optimize(text) == (text, 0)
+
+
+def test_overwritten_store():
+    assert optimize("f:\n\tsw $t0, -12($fp)\n\tsw $t1, -12($fp)\n") == ("f:\n\tsw $t1, -12($fp)\n", 1)
+
+
+def test_stack_adjustments():
+    assert optimize("f:\n\taddiu $sp, $sp, -8\n\taddi $sp, $sp, 4\n") == ("f:\n\taddiu $sp, $sp, -4\n", 1)
+    assert optimize("f:\n\taddiu $sp, $fp, -20\n\taddi $sp, $fp, 8\n") == ("f:\n\taddi $sp, $fp, 8\n", 1)
+    assert optimize("f:\n\taddiu $sp, $fp, -8\n\taddiu $sp, $sp, 8\n") == ("f:\n\taddiu $sp, $fp, 0\n", 1)
+
+
+def test_useless_moves():
+    assert optimize("f:\n\tmove $s0, $s0\n\tjr $ra\n") == ("f:\n\tjr $ra\n", 1)
+    assert optimize("f:\n\tmove $a0, $s0\n\tmove $s0, $a0\n") == ("f:\n\tmove $a0, $s0\n", 1)
+
+
+def test_useless_stack_adjustment():
+    assert optimize("f:\n\taddiu $sp, $sp, 0\n\tjr $ra\n") == ("f:\n\tjr $ra\n", 1)
+
+
+def test_labels_that_are_jumped_to_end_the_window():
+    text = "f:\n\tsw $t0, -12($fp)\nloop:\n\tlw $t0, -12($fp)\n\tb loop\n"
+    assert optimize(text) == (text, 0)
+    # a label only reached by falling through is dropped
+    assert optimize("f:\n\tsw $t0, -12($fp)\nnext:\n\tlw $t0, -12($fp)\n") == ("f:\n\tsw $t0, -12($fp)\n", 1)
+
+
+def test_replacements_combine_with_the_instruction_before():
+    text = "f:\n\taddiu $sp, $sp, -4\n\tmove $t0, $t0\n\taddiu $sp, $sp, 4\n"
+    assert optimize(text) == ("f:\n", 3)
@@ -0,0 +1,64 @@
+from compiler import inline, reachability
+from tests import lower, assemble
+
+program = """
+class A {
+    f():Int { 1 };
+    unused():String { "only in unused" };
+};
+class B inherits A { f():Int { 2 }; };
+class C inherits A { f():Int { 3 }; };
+class Never { g():Int { 4 }; };
+class Main {
+    a:A <- new B;
+    main():Int { a.f() };
+};
+"""
+
+
+def test_dispatch_reaches_instantiated_subclasses_only():
+    reachable, instantiated = reachability.find_reachable(lower(program))
+    assert {"Main.main", "Main_init", "B.f"} <= reachable
+    # B has no attribute initializer, its init function is never called
+    assert "B_init" not in reachable and "A_init" not in reachable
+    # A and C are never instantiated, their f cannot run
+    assert "A.f" not in reachable and "C.f" not in reachable
+    assert "A.unused" not in reachable and "Never.g" not in reachable
+    assert "C_init" not in reachable
+    assert instantiated == {"Main", "Int", "String", "Bool", "B"}
+
+
+def test_new_self_type_reaches_init_of_subclasses():
+    source = """
+    class A { copy_me():A { new SELF_TYPE }; };
+    class B inherits A { };
+    class Main { main():A { (new B).copy_me() }; };
+    """
+    reachable, _ = reachability.find_reachable(lower(source))
+    assert {"A.copy_me", "B_init"} <= reachable
+
+
+def test_dead_code_is_left_out_of_the_assembly(monkeypatch):
+    # keep the calls, small methods would be inlined
+    monkeypatch.setattr(inline, "INLINE_BUDGET", 0)
+    assembly = assemble(program)
+    assert "B.f:" in assembly and "B_protObj:" in assembly
+    assert "A.f:" not in assembly and "C.f:" not in assembly
+    assert "Never_protObj:" not in assembly and "Never_dispTab:" not in assembly
+    assert "only in unused" not in assembly
+    # A.unused keeps its slot in the dispatch table of B
+    dispatch_table = assembly.split("B_dispTab:\n")[1].split(":")[0].split("\n")
+    assert dispatch_table[3:5] == ["\t.word B.f", "\t.word 0"]
+
+
+def test_new_self_type_inlined_in_another_class_keeps_the_init():
+    assembly = assemble("""
+    class A { clone():A { new SELF_TYPE }; };
+    class B inherits A { };
+    class Main { main():Object { (new B).clone() }; };
+    """)
+    # clone is inlined in Main.main, it still calls the init of B
+    assert "A.clone:" not in assembly
+    table = assembly.split("class_objTab:\n")[1].split(":")[0].split("\n")
+    assert table[table.index("\t.word B_protObj") + 1] == "\t.word B_init"
+    assert "B_init:" in assembly
@@ -0,0 +1,56 @@
+from compiler import regalloc, ir
+from tests import assemble
+
+
+def test_disjoint_intervals_share_a_register():
+    a, b = ir.Temp(1), ir.Temp(2)
+    registers, spilled = regalloc.linear_scan({a: (0, 2), b: (2, 4)}, set())
+    assert registers[a] == registers[b] == regalloc.CALLER_SAVED[0]
+    assert spilled == {}
+
+
+def test_values_live_across_calls_take_callee_saved_registers():
+    a, b = ir.Temp(1), ir.Temp(2)
+    registers, _ = regalloc.linear_scan({a: (0, 4), b: (1, 2)}, {a})
+    assert registers[a] in regalloc.CALLEE_SAVED
+    assert registers[b] in regalloc.CALLER_SAVED
+
+
+def test_interval_ending_last_is_spilled():
+    count = len(regalloc.CALLER_SAVED + regalloc.CALLEE_SAVED)
+    intervals = {ir.Temp(i): (i, 100 - i) for i in range(count)}
+    intervals[ir.Temp(count)] = (count, count + 1)
+    registers, spilled = regalloc.linear_scan(intervals, set())
+    assert spilled == {ir.Temp(0): (0, 100)}
+    assert ir.Temp(count) in registers
+
+
+def test_live_across_calls():
+    function = ir.Function("A.f", "A", 0)
+    a, b, c = (function.new_temp() for _ in range(3))
+    function.blocks.append(ir.BasicBlock("f", [
+        ir.LoadImm(a, 1),
+        ir.LoadImm(b, 2),
+        ir.Call(c, "A.g", [function.params[0], b]),
+        ir.BinOp(c, "add", a, 3),
+        ir.Return(c),
+    ]))
+    program = ir.Program(None, {}, {})
+    intervals = ir.live_intervals(function)
+    # b is an argument, read before the call
+    assert regalloc.live_across_calls(function, intervals, program) == {a}
+
+
+def compile_main(source):
+    return assemble(source).split("Main.main:\n")[1].split("\tjr $ra\n")[0]
+
+
+def test_only_the_registers_used_are_saved():
+    main = compile_main("class Main { main():String { \"main\" }; };")
+    assert "$s0" not in main and "$s1" not in main
+    main = compile_main("""class Main inherits IO { main():Object {
+        let i:Int <- 0 in while i < 10 loop { out_int(i); i <- i + 1; } pool
+    }; };""")
+    # i lives across the calls
+    assert "\tsw $s0, -8($fp)\n\tsw $s1, -12($fp)\n" in main
+    assert "\tlw $s0, -8($fp)\n\tlw $s1, -12($fp)\n" in main
@@ -61,7 +61,33 @@ def test_classes_inheriting_from_each_other_fails_validation():
     semant.build_inheritance_graph(ast)
     with pytest.raises(semant.SemantError) as e:
         semant.check_for_inheritance_cycles()
-    assert str(e.value) == "B involved in an inheritance cycle." or str(e.value) == "A involved in an inheritance cycle."
+    assert str(e.value) == "A, B involved in an inheritance cycle."
+
+
+def test_all_inheritance_cycles_are_reported_together():
+    ast = [
+            Class('A', 'B', []), Class('B', 'A', []),
+            Class('C', 'D', []), Class('D', 'E', []), Class('E', 'C', []),
+            Class('F', 'F', []),
+            Class('G', 'A', []), Class('H', 'Object', []),
+         ]
+    semant.build_inheritance_graph(ast)
+    assert semant.find_inheritance_cycles() == [['A', 'B'], ['C', 'D', 'E'], ['F']]
+    with pytest.raises(semant.SemantError) as e:
+        semant.check_for_inheritance_cycles()
+    assert str(e.value) == "A, B involved in an inheritance cycle.\n" \
+                           "C, D, E involved in an inheritance cycle.\n" \
+                           "F involved in an inheritance cycle."
+
+
+def test_large_hierarchies_are_checked_for_cycles():
+    ast = [Class('C0', 'Object', [])]
+    for i in range(1, 50000):
+        ast.append(Class('C%d' % i, 'C%d' % (i - 1), []))
+    ast.append(Class('X0', 'X1', []))
+    ast.append(Class('X1', 'X0', []))
+    semant.build_inheritance_graph(ast)
+    assert semant.find_inheritance_cycles() == [['X0', 'X1']]
 
 
 def test_class_with_double_defined_attrs():
@@ -756,3 +782,208 @@ def test_class_with_method_redefinition_works():
 
 
 
+def test_long_expression_chains_do_not_hit_recursion_limit():
+    body = Int(0)
+    for i in range(100000):
+        body = Plus(body, Int(i))
+    ast = [
+            Class('Main', 'Object', [
+               Method('main', [], 'Int', body),
+            ])
+    ]
+    semant.semant(ast)
+    assert body.return_type == "Int"
+
+
+def test_deeply_nested_lets_do_not_hit_recursion_limit():
+    body = Object('x0')
+    for i in range(100000):
+        body = Let('x%d' % i, 'Int', Int(i), body)
+    ast = [
+            Class('Main', 'Object', [
+               Method('main', [], 'Int', body),
+            ])
+    ]
+    semant.semant(ast)
+    assert body.return_type == "Int"
+
+
+def test_deep_class_hierarchies_do_not_hit_recursion_limit():
+    ast = [
+            Class('C0', 'Object', [
+               Method('funk', [], 'SELF_TYPE', Object('self')),
+            ])
+    ]
+    for i in range(1, 10000):
+        ast.append(Class('C%d' % i, 'C%d' % (i - 1), []))
+    dispatch = Dispatch(Object('leaf'), 'funk', [])
+    ast.append(Class('Main', 'Object', [
+               Attr('leaf', 'C9999', None),
+               Method('main', [], 'C0', dispatch),
+            ]))
+    semant.semant(ast)
+    assert semant.is_conformant('C9999', 'C0')
+    assert dispatch.return_type == 'C9999'
+
+
+def test_all_errors_are_collected_in_one_run():
+    ast = [
+            Class('A', 'Object', [
+               Attr('x', 'Int', Str("jjj")),
+               Method('funk', [], 'Int',
+                   Block([
+                      Plus(Object('ghost'), Int(1)),
+                      If(Int(3), Int(2), Int(1)),
+                      Dispatch(Object('ghost'), 'ghostmethod', []),
+                      Dispatch("self", 'ghostmethod', []),
+                      Let('y', 'Int', Str("jjj"), Not(Int(1))),
+                      Int(2)
+                      ])
+               ),
+            ])
+    ]
+    with pytest.raises(semant.SemantErrors) as e:
+        semant.semant(ast, all_errors=True)
+    assert e.value.errors == [
+        "variable ghost not in scope",
+        "variable ghost not in scope",
+        "Tried to call the undefined method ghostmethod in class A",
+        "Inferred type String for attribute x does not conform to declared type Int",
+        "If statements must have boolean conditions",
+        "The inferred type String for let init is not conformant to declared type Int",
+        "Not statement require boolean values",
+    ]
+    assert semant.diagnostics is None
+
+
+def test_hierarchy_errors_are_collected_before_stopping():
+    ast = [
+            Class('A', 'B', []), Class('B', 'A', []),
+            Class('C', 'Int', []),
+            Class('C', 'Object', [
+               Method('funk', [], 'Int', Object('ghost')),
+            ]),
+    ]
+    with pytest.raises(semant.SemantErrors) as e:
+        semant.semant(ast, all_errors=True)
+    assert e.value.errors == [
+        "class C already defined",
+        "Class C cannot inherit from base class Int",
+        "A, B involved in an inheritance cycle.",
+    ]
+
+
+def test_undefined_classes_in_new_and_case_are_collected():
+    ast = parser.parse("class Main { main():Object { if true then new Foo else 1 fi }; };")
+    with pytest.raises(semant.SemantErrors) as e:
+        semant.semant(ast, all_errors=True)
+    assert e.value.errors == ["new of the undefined class Foo"]
+    ast = parser.parse("class Main { main():Object { case 1 of x:Baz => x; y:Int => y; esac }; };")
+    with pytest.raises(semant.SemantErrors) as e:
+        semant.semant(ast, all_errors=True)
+    assert e.value.errors == ["branch of the undefined class Baz"]
+
+
+def test_first_error_is_raised_without_all_errors():
+    ast = [
+            Class('A', 'Object', [
+               Method('funk', [], 'Int', Plus(Object('ghost'), Object('ghost2'))),
+            ])
+    ]
+    with pytest.raises(semant.SemantError) as e:
+        semant.semant(ast)
+    assert not isinstance(e.value, semant.SemantErrors)
+    assert str(e.value) == "variable ghost not in scope"
+
+
+def test_base_classes_are_checked_once_and_shared():
+    first_ast = [Class('Main', 'IO', [])]
+    second_ast = [Class('Main', 'Object', [])]
+    first = semant.semant(first_ast)
+    second = semant.semant(second_ast)
+    assert len(first_ast) == 1  # base classes are not appended to the program
+    assert len(second_ast) == 1
+    for clname in ['Object', 'IO', 'Int', 'Bool', 'String']:
+        assert first.classes[first.ids[clname]] is second.classes[second.ids[clname]]
+    io = second.classes[second.ids['IO']]
+    assert [f.name for f in io.feature_list].count('abort') == 1
+    assert 'out_string' in dict(first.methods[first.ids['Main']])
+    assert 'out_string' not in dict(second.methods[second.ids['Main']])
+
+
+def test_class_table_layouts():
+    ast = [
+            Class('C', 'B', [
+               Attr('c', 'Int', None),
+               Method('second', [], 'Int', Int(3)),
+            ]),
+            Class('A', 'Object', [
+               Attr('a1', 'Int', None),
+               Attr('a2', 'Int', None),
+               Method('first', [], 'Int', Int(1)),
+               Method('second', [], 'Int', Int(2)),
+            ]),
+            Class('B', 'A', [
+               Attr('b', 'Int', None),
+            ]),
+    ]
+    table = semant.semant(ast)
+    assert sorted(table.ids.values()) == list(range(len(table)))
+    a, b, c = table.ids['A'], table.ids['B'], table.ids['C']
+    assert table.parents[c] == b and table.parents[b] == a
+    assert table.parents[table.ids['Object']] == -1
+    assert table.depths[c] == 3
+    assert [attr.name for attr in table.attributes[c]] == ['a1', 'a2', 'b', 'c']
+    assert dict(table.methods[c])['first'] == 'A'
+    assert dict(table.methods[c])['second'] == 'C'
+    assert dict(table.methods[c])['abort'] == 'Object'
+    assert table.conforms(c, a)
+    assert not table.conforms(a, c)
+    assert table.common_ancestor(c, table.ids['IO']) == table.ids['Object']
+
+
+def test_method_slots_are_stable_across_subclasses():
+    ast = [
+            Class('C', 'B', [
+               Method('first', [], 'Int', Int(3)),
+               Method('third', [], 'Int', Int(4)),
+            ]),
+            Class('A', 'Object', [
+               Method('first', [], 'Int', Int(1)),
+               Method('second', [], 'Int', Int(2)),
+            ]),
+            Class('B', 'A', [
+               Method('second', [], 'Int', Int(5)),
+               Method('abort', [], 'Object', Int(6)),
+            ]),
+    ]
+    table = semant.semant(ast)
+    obj, a, b, c = (table.ids[x] for x in ['Object', 'A', 'B', 'C'])
+    for parent, child in [(obj, a), (a, b), (b, c)]:
+        # the parent table is a prefix of the child one, up to overrides
+        parent_methods = [name for name, _ in table.methods[parent]]
+        assert [name for name, _ in table.methods[child]][:len(parent_methods)] == parent_methods
+        for name, slot in table.method_slots[parent].items():
+            assert table.method_slots[child][name] == slot
+    assert table.methods[c] == [('abort', 'B'), ('type_name', 'Object'), ('copy', 'Object'),
+                                ('first', 'C'), ('second', 'B'), ('third', 'C')]
+    assert table.method_slots[c]['third'] == 5
+
+
+def test_class_ids_are_numbered_in_preorder():
+    ast = [
+            Class('B', 'A', []),
+            Class('A', 'Object', []),
+            Class('C', 'Object', []),
+            Class('D', 'A', []),
+            Class('E', 'B', []),
+    ]
+    table = semant.semant(ast)
+    assert table.names == ['Object', 'IO', 'Int', 'Bool', 'String', 'A', 'B', 'E', 'D', 'C']
+    a, b, d, e = (table.ids[x] for x in 'ABDE')
+    assert table.max_descendants[a] == max(a, b, d, e)
+    assert table.max_descendants[b] == e
+    for child in (b, d, e):
+        assert table.conforms(child, a)
+    assert not table.conforms(table.ids['C'], a)
+    assert table.max_descendants[table.ids['Object']] == len(table) - 1
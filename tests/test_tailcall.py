@@ -0,0 +1,71 @@
+from compiler import ir, inline
+from compiler.tailcall import mark_tail_calls
+from tests import program_with, assemble
+
+import re
+
+
+def test_call_returned_through_a_join_block_is_marked():
+    t = [ir.Temp(i) for i in range(2, 8)]
+    call = ir.Call(t[0], "A.f", [ir.Temp(0), ir.Temp(1)])
+    program, function = program_with(
+        ("entry", [ir.Branch("eq", ir.Temp(1), 0, "then", "else")]),
+        ("then", [ir.LoadImm(t[1], 0), ir.Move(t[2], t[1]), ir.Jump("join")]),
+        ("else", [call, ir.Unbox(t[3], t[0]), ir.Move(t[2], t[3]), ir.Jump("join")]),
+        ("join", [ir.Box(t[4], "Int", t[2]), ir.Return(t[4])]))
+    mark_tail_calls(program)
+    assert function.blocks[2].instructions == [call._replace(tail=True), ir.Return(t[0])]
+    assert program.statistics["tail calls"] == 1
+    # still reached from the other branch
+    assert function.blocks[3].label == "join"
+
+
+def test_call_whose_result_is_used_is_not_marked():
+    t = [ir.Temp(i) for i in range(2, 8)]
+    instructions = [
+        ir.Call(t[0], "A.f", [ir.Temp(0), ir.Temp(1)]), ir.Unbox(t[1], t[0]),
+        ir.BinOp(t[2], "add", t[1], 1), ir.Box(t[3], "Int", t[2]), ir.Return(t[3])]
+    program, function = program_with(("entry", instructions))
+    mark_tail_calls(program)
+    assert function.blocks[0].instructions == instructions
+    # nor a call returned after another one
+    instructions = [
+        ir.VirtualCall(t[0], "A", "f", [ir.Temp(0), ir.Temp(1)]),
+        ir.VirtualCall(t[1], "A", "f", [ir.Temp(0), ir.Temp(1)]), ir.Return(t[0])]
+    program, function = program_with(("entry", instructions))
+    mark_tail_calls(program)
+    assert function.blocks[0].instructions == instructions
+
+
+def compile_method(source, name, monkeypatch):
+    monkeypatch.setattr(inline, "INLINE_BUDGET", 0)
+    # up to the next function
+    return re.split(r"\n(?!label)\S+:\n", assemble(source).split("%s:\n" % name)[1])[0]
+
+
+def test_self_recursion_loops_in_the_same_frame(monkeypatch):
+    source = """class Main {
+        sum(n:Int, acc:Int):Int { if n = 0 then acc else { n; sum(n - 1, acc + n); } fi };
+        main():Int { sum(100000, 0) };
+    };"""
+    sum = compile_method(source, "Main.sum", monkeypatch)
+    entry = sum.split("move $s0, $a0\n")[1].split(":")[0]
+    assert "jal Main.sum" not in sum
+    assert "\tb %s\n" % entry in sum
+    # the new arguments replace the ones of the running call
+    assert "\tsw $t0, 8($fp)\n" in sum and "\tsw $t0, 4($fp)\n" in sum
+
+
+def test_sibling_and_virtual_calls_reuse_the_frame(monkeypatch):
+    source = """class Main {
+        even(n:Int):Bool { if n = 0 then true else odd(n - 1) fi };
+        odd(n:Int):Bool { if n = 0 then false else even(n - 1) fi };
+        main():Object { case even(10) of b:Bool => b.copy(); esac };
+    };"""
+    odd = compile_method(source, "Main.odd", monkeypatch)
+    assert "jal Main.even" not in odd
+    assert "\taddiu $sp, $fp, 0\n\tlw $fp, 0($fp)\n\tj Main.even\n" in odd
+    main = compile_method(source, "Main.main", monkeypatch)
+    # without arguments the frame of main has no room for the one of even
+    assert "jal Main.even" in main
+    assert "\taddiu $sp, $fp, 0\n\tlw $fp, 0($fp)\n\tj Object.copy\n" in main
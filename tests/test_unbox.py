@@ -0,0 +1,34 @@
+from compiler import ir
+from compiler.unbox import remove_boxing
+from tests import program_with
+
+
+def test_unbox_of_a_box_uses_the_word():
+    t = [ir.Temp(i) for i in range(2, 8)]
+    program, function = program_with(("f", [
+        ir.LoadImm(t[0], 5), ir.Box(t[1], "Int", t[0]), ir.Move(t[2], t[1]),
+        ir.Unbox(t[3], t[2]), ir.Return(t[3])]))
+    remove_boxing(program)
+    assert function.blocks[0].instructions == [ir.LoadImm(t[0], 5), ir.Move(t[3], t[0]), ir.Return(t[3])]
+    assert program.statistics["removed boxes"] == 1
+
+
+def test_box_of_a_variable_is_kept():
+    t = [ir.Temp(i) for i in range(2, 8)]
+    instructions = [
+        ir.LoadImm(t[0], 5), ir.Box(t[1], "Int", t[0]), ir.LoadImm(t[0], 6),
+        ir.Unbox(t[2], t[1]), ir.Return(t[2])]
+    program, function = program_with(("f", instructions))
+    remove_boxing(program)
+    # the variable changed after it was boxed
+    assert function.blocks[0].instructions == instructions
+
+
+def test_escaping_box_is_kept():
+    t = [ir.Temp(i) for i in range(2, 8)]
+    program, function = program_with(("f", [
+        ir.LoadImm(t[0], 5), ir.Box(t[1], "Int", t[0]), ir.Unbox(t[2], t[1]),
+        ir.Call(t[3], "A.g", [ir.Temp(0), t[1]]), ir.Return(t[2])]))
+    remove_boxing(program)
+    assert ir.Box(t[1], "Int", t[0]) in function.blocks[0].instructions
+    assert program.statistics["removed boxes"] == 0